@@ -1,6 +1,7 @@
 import { defineStore } from "pinia";
 import type { Bird, HotspotOverview, DetailedHotspot } from "../types";
 import axios from "axios";
+import { waitForJob } from "../utils/waitForJob";
 
 export const useAnalyticsStore = defineStore("analytics", {
   state: () => ({
@@ -38,6 +39,15 @@ export const useAnalyticsStore = defineStore("analytics", {
     // client-side memory cache for hotspot details
     hotspotDetailCache: {} as Record<string, DetailedHotspot>,
 
+    // report birds are fetched a page at a time, further pages on demand (loadMoreBirds).
+    // the server returns the whole ranking unless a limit is passed, so every request sets one
+    reportPageSize: 50,
+    birdsWanted: 0,
+    isLoadingMoreBirds: false,
+
+    // bumped by each pollPendingImages call so an older poll loop stops
+    imagePollId: 0,
+
     // --- Analytics Panels / Toggles ---
     // dynamic year defaults: current year and 20 years prior
     startYear: new Date().getFullYear() - 20,
@@ -71,6 +81,26 @@ export const useAnalyticsStore = defineStore("analytics", {
         (a, b) => a.Rank - b.Rank,
       );
     },
+
+    // length of the whole ranking, including pages not loaded yet
+    getTotalBirds(state) {
+      return (
+        state.selectedHotspot?.total_birds ??
+        state.selectedHotspot?.birds?.length ??
+        0
+      );
+    },
+
+    getReportParams(state) {
+      return {
+        start_yr: state.startYear,
+        end_yr: state.endYear,
+        start_month: state.startMonth,
+        start_week: state.startWeek,
+        end_month: state.endMonth,
+        end_week: state.endWeek,
+      };
+    },
   },
 
   actions: {
@@ -495,15 +525,13 @@ export const useAnalyticsStore = defineStore("analytics", {
       this.isLoading = true;
       this.error = null;
 
-      // 1. Prepare the query parameters object
+      // 1. Prepare the query parameters object (first page, enough for the top birds)
       const params = {
-        start_yr: this.startYear,
-        end_yr: this.endYear,
-        start_month: this.startMonth,
-        start_week: this.startWeek,
-        end_month: this.endMonth,
-        end_week: this.endWeek,
+        ...this.getReportParams,
+        offset: 0,
+        limit: Math.max(this.reportPageSize, this.numTopBirds),
       };
+      this.birdsWanted = 0;
 
       // 2. Construct the base URL using the path parameter
       const url = `/api/hotspots/report/${this.selectedHotspotId}`;
@@ -515,6 +543,8 @@ export const useAnalyticsStore = defineStore("analytics", {
         this.selectedHotspot = this.hotspotDetailCache[cacheKey];
         this.isLoading = false;
         this.prebuildPdf();
+        this.pollPendingImages();
+        this.loadMoreBirds(this.numTopBirds);
         return;
       }
 
@@ -541,66 +571,42 @@ export const useAnalyticsStore = defineStore("analytics", {
           const jobId = response.data.jobId;
           if (!jobId) throw new Error("No job ID returned.");
 
-          console.log(`Job enqueued: ${jobId}. Polling...`);
-
-          let pollCount = 0;
-          const maxPolls = 24; // 2 minutes timeout
-          let pollDelay = 500; // start 500ms for instant cached loads
+          console.log(`Job enqueued: ${jobId}. Waiting for result...`);
+
+          try {
+            const result = await waitForJob(jobId);
+            this.selectedHotspot = result;
+            // save to cache
+            this.hotspotDetailCache[cacheKey] = result;
+            (this as any)._fetchRetryCount = 0; // reset on success
+            console.log("Fetched hotspot detail (async):", result);
+            this.prebuildPdf();
+            this.pollPendingImages();
+          } catch (pollError: any) {
+            // if server restarted + job ID is gone, re-trigger the fetch
+            if (
+              axios.isAxiosError(pollError) &&
+              pollError.response?.status === 404
+            ) {
+              // limit retries to prevent infinite loops
+              const currentRetries = (this as any)._fetchRetryCount || 0;
+              if (currentRetries >= 3) {
+                console.error("max retries reached, giving up.");
+                throw new Error("server restarted - please refresh the page");
+              }
+              (this as any)._fetchRetryCount = currentRetries + 1;
 
-          // poll for result
-          while (true) {
-            pollCount++;
-            if (pollCount > maxPolls) {
-              throw new Error(
-                "Request timed out after 2 minutes. Please refresh and try again.",
+              console.warn(
+                `Job ${jobId} not found (server restart?). Re-fetching in 1s... (retry ${
+                  currentRetries + 1
+                }/3)`,
               );
-            }
 
-            await new Promise((resolve) => setTimeout(resolve, pollDelay));
-            pollDelay = Math.min(pollDelay * 2, 5000); // exponential backoff up to 5s
-
-            try {
-              const pollResponse = await axios.get(`/api/jobs/${jobId}`);
-              const job = pollResponse.data;
-
-              if (job.status === "completed") {
-                this.selectedHotspot = job.result;
-                // save to cache
-                this.hotspotDetailCache[cacheKey] = job.result;
-                (this as any)._fetchRetryCount = 0; // reset on success
-                console.log("Fetched hotspot detail (async):", job.result);
-                this.prebuildPdf();
-                break;
-              } else if (job.status === "failed") {
-                throw new Error(job.error || "Job failed");
-              }
-              // continue polling if queued or processing
-            } catch (pollError: any) {
-              // if server restarted + job ID is gone, re-trigger the fetch
-              if (
-                axios.isAxiosError(pollError) &&
-                pollError.response?.status === 404
-              ) {
-                // limit retries to prevent infinite loops
-                const currentRetries = (this as any)._fetchRetryCount || 0;
-                if (currentRetries >= 3) {
-                  console.error("max retries reached, giving up.");
-                  throw new Error("server restarted - please refresh the page");
-                }
-                (this as any)._fetchRetryCount = currentRetries + 1;
-
-                console.warn(
-                  `Job ${jobId} not found (server restart?). Re-fetching in 1s... (retry ${
-                    currentRetries + 1
-                  }/3)`,
-                );
-
-                // wait before retry to prevent overwhelming the server
-                await new Promise((resolve) => setTimeout(resolve, 1000));
-                return this.fetchHotspotDetail(); // recursive retry
-              }
-              throw pollError; // re-throw other errors
+              // wait before retry to prevent overwhelming the server
+              await new Promise((resolve) => setTimeout(resolve, 1000));
+              return this.fetchHotspotDetail(); // recursive retry
             }
+            throw pollError; // re-throw other errors
           }
         } else {
           // fallback if backend returns immediate result
@@ -620,6 +626,7 @@ export const useAnalyticsStore = defineStore("analytics", {
           this.hotspotDetailCache[cacheKey] = data;
           console.log("Fetched hotspot detail (immediate):", data);
           this.prebuildPdf();
+          this.pollPendingImages();
         }
       } catch (e: any) {
         this.error = e.message ?? "Unknown error";
@@ -629,6 +636,111 @@ export const useAnalyticsStore = defineStore("analytics", {
       }
     },
 
+    /**
+     * Fetch one page of the selected report's ranking (birds offset+1..offset+limit).
+     * The ranking is cached server side once the first page loaded, so this is
+     * normally answered directly; a 202 (cache expired) is waited for like the first page.
+     */
+    async fetchReportPage(
+      offset: number,
+      limit: number,
+    ): Promise<DetailedHotspot> {
+      const url = `/api/hotspots/report/${this.selectedHotspotId}`;
+      const response = await axios.get(url, {
+        params: { ...this.getReportParams, offset, limit },
+      });
+
+      const data =
+        response.status === 202
+          ? await waitForJob(response.data.jobId)
+          : response.data;
+      if (!data || typeof data !== "object") {
+        throw new Error("Invalid response format from server.");
+      }
+      return data;
+    },
+
+    /**
+     * Load further pages of the selected report until at least `upTo` birds
+     * (default: all of them) are loaded. Calls made while pages are loading
+     * raise the target instead of starting another loop.
+     */
+    async loadMoreBirds(upTo?: number) {
+      const hotspot = this.selectedHotspot;
+      if (!hotspot || !this.selectedHotspotId) return;
+
+      this.birdsWanted = Math.max(this.birdsWanted, upTo ?? Infinity);
+      if (this.isLoadingMoreBirds) return;
+
+      this.isLoadingMoreBirds = true;
+      try {
+        while (this.selectedHotspot === hotspot) {
+          const loaded = hotspot.birds.length;
+          const target = Math.min(
+            this.birdsWanted,
+            hotspot.total_birds ?? loaded,
+          );
+          if (loaded >= target) break;
+
+          const page = await this.fetchReportPage(
+            loaded,
+            Math.max(this.reportPageSize, target - loaded),
+          );
+          if (this.selectedHotspot !== hotspot || page.birds.length === 0) {
+            break;
+          }
+          // the cached report is the same object, so it keeps the new pages too
+          hotspot.birds.push(...page.birds);
+          this.pollPendingImages();
+        }
+      } catch (e: any) {
+        console.error("Error loading more birds:", e);
+      } finally {
+        this.isLoadingMoreBirds = false;
+      }
+    },
+
+    /**
+     * Fill in images of the selected report's birds that were still being fetched
+     * (imagePending) when the report was served. Polls /species/images with a
+     * growing delay until nothing is pending, the report changes or it gives up.
+     */
+    async pollPendingImages() {
+      const pollId = ++this.imagePollId;
+      const hotspot = this.selectedHotspot;
+      const maxCodes = 100; // MAX_IMAGE_CODES on the server
+
+      for (let attempt = 0; attempt < 10; attempt++) {
+        const pending = (hotspot?.birds ?? []).filter(
+          (bird) => bird.imagePending && bird.birdCode,
+        );
+        if (!hotspot || pending.length === 0) return;
+
+        const delay = Math.min(1000 * (attempt + 1), 5000);
+        await new Promise((resolve) => setTimeout(resolve, delay));
+        if (pollId !== this.imagePollId || this.selectedHotspot !== hotspot) {
+          return;
+        }
+
+        const codes = [...new Set(pending.map((bird) => bird.birdCode!))];
+        try {
+          for (let i = 0; i < codes.length; i += maxCodes) {
+            const response = await axios.get("/api/species/images", {
+              params: { codes: codes.slice(i, i + maxCodes).join(",") },
+            });
+            for (const bird of pending) {
+              const status = response.data[bird.birdCode!];
+              if (!status) continue;
+              if (status.imageUrl) bird.imageUrl = status.imageUrl;
+              bird.imagePending = status.pending;
+            }
+          }
+        } catch (e: any) {
+          console.error("Error polling species images:", e);
+        }
+      }
+    },
+
     async prebuildPdf() {
       if (!this.selectedHotspotId || !this.selectedHotspot) return;
 
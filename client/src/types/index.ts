@@ -5,7 +5,9 @@ export interface Bird {
   rfpc: number,
   birdCode?: string,
   speciesUrl: string,
-  imageUrl?: string
+  imageUrl?: string,
+  // image is still being fetched server side, filled in by pollPendingImages
+  imagePending?: boolean
 }
 
 
@@ -18,6 +20,10 @@ export interface DetailedHotspot {
   total_sample_size: number;
   sample_sizes_by_week: Record<string, number>;
   birds: Bird[];
+  // paging: birds holds ranks offset+1.. of total_birds
+  offset?: number;
+  limit?: number;
+  total_birds?: number;
   isSaved?: boolean;
 }
 
@@ -0,0 +1,94 @@
+import axios from "axios";
+
+/**
+ * Thrown when the job event stream can't be used (no EventSource, proxy
+ * closed the connection, ...) so the caller falls back to polling.
+ */
+class StreamUnavailableError extends Error {}
+
+/**
+ * Wait for a background job and resolve with its result.
+ *
+ * Listens on the server-sent events stream at /api/jobs/{jobId}/events,
+ * which pushes one small message per state change and sends the result
+ * once. Falls back to polling /api/jobs/{jobId} with exponential backoff
+ * if the stream is unavailable. Polling errors (e.g. a 404 after a server
+ * restart) are re-thrown unchanged so callers can handle them.
+ */
+export async function waitForJob(
+  jobId: string,
+  timeoutMessage = "Request timed out after 2 minutes. Please refresh and try again.",
+): Promise<any> {
+  try {
+    return await listenForJob(jobId, timeoutMessage);
+  } catch (error) {
+    if (!(error instanceof StreamUnavailableError)) throw error;
+    console.warn(`Job event stream unavailable for ${jobId}. Polling...`);
+  }
+  return pollForJob(jobId, timeoutMessage);
+}
+
+function listenForJob(jobId: string, timeoutMessage: string): Promise<any> {
+  return new Promise((resolve, reject) => {
+    if (typeof EventSource === "undefined") {
+      reject(new StreamUnavailableError());
+      return;
+    }
+
+    const source = new EventSource(`/api/jobs/${jobId}/events`);
+    const timeout = setTimeout(() => {
+      source.close();
+      reject(new Error(timeoutMessage));
+    }, 120000); // 2 minutes timeout
+
+    const finish = () => {
+      clearTimeout(timeout);
+      source.close();
+    };
+
+    source.addEventListener("queued", (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      if (data.position) {
+        console.log(`Job ${jobId} queued at position ${data.position}`);
+      }
+    });
+    source.addEventListener("completed", (event) => {
+      finish();
+      resolve(JSON.parse((event as MessageEvent).data).result);
+    });
+    source.addEventListener("failed", (event) => {
+      finish();
+      reject(new Error(JSON.parse((event as MessageEvent).data).error || "Job failed"));
+    });
+    source.onerror = () => {
+      finish();
+      reject(new StreamUnavailableError());
+    };
+  });
+}
+
+async function pollForJob(jobId: string, timeoutMessage: string): Promise<any> {
+  let pollCount = 0;
+  const maxPolls = 24; // 2 minutes timeout
+  let pollDelay = 500; // start 500ms for instant cached loads
+
+  while (true) {
+    pollCount++;
+    if (pollCount > maxPolls) {
+      throw new Error(timeoutMessage);
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, pollDelay));
+    pollDelay = Math.min(pollDelay * 2, 5000); // exponential backoff up to 5s
+
+    const pollResponse = await axios.get(`/api/jobs/${jobId}`);
+    const job = pollResponse.data;
+
+    if (job.status === "completed") {
+      return job.result;
+    } else if (job.status === "failed") {
+      throw new Error(job.error || "Job failed");
+    }
+    // continue polling if queued or processing
+  }
+}
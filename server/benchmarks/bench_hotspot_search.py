@@ -0,0 +1,92 @@
+'''
+benchmark: hotspot name search latency, LIKE scan vs the FTS5 trigram index, on the full
+hotspots table in server/data/database/locations.db.
+
+from the repo root:
+    PYTHONPATH=server python server/benchmarks/bench_hotspot_search.py
+    PYTHONPATH=server python server/benchmarks/bench_hotspot_search.py --rounds 20 --country "United States"
+
+if the database doesn't have the search index yet, it is built in a temporary copy
+(locations.db itself is left untouched).
+'''
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+from services import search_db, locations_db
+from services.locations_db import query_one
+
+QUERIES = [
+    "central park", "lake", "reserva natural", "river trail", "bosque", "marsh",
+    "national wildlife refuge", "jardin botanico", "beach", "point pelee", "mt", "ko",
+]
+
+def time_search(query, country, rounds):
+    samples = []
+    results = None
+    for _ in range(rounds):
+        # measure the database path, not the autocomplete cache
+        search_db.clear_search_cache()
+        start = time.perf_counter()
+        # search prints every sql query, keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = search_db.dynamic_search(hotspot=query, country=country, mode='hotspot')
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples, results or []
+
+def use_indexed_copy(tmp_dir):
+    """point the read-only pool at a migrated copy of locations.db"""
+    copy_file = os.path.join(tmp_dir, 'locations.db')
+    print(f"no search index in {locations_db.DB_FILE}, building it in a copy at {copy_file}...")
+    with sqlite3.connect(f"file:{locations_db.DB_FILE}?mode=ro", uri=True) as src, sqlite3.connect(copy_file) as dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+
+    from services.database_sync import migrate_locations_db
+    migrate_locations_db(copy_file)
+    locations_db.close_connections()
+    locations_db.DB_FILE = copy_file
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+def main(rounds, country):
+    total = query_one("SELECT COUNT(*) FROM hotspots")[0]
+    print(f"{total} hotspots, {rounds} rounds per query{f', country = {country}' if country else ''}\n")
+    print(f"{'query':<28}{'LIKE p50':>10}{'p99':>9}{'FTS p50':>10}{'p99':>9}{'speedup':>9}  top result (LIKE / FTS)")
+
+    totals = {False: [], True: []}
+    for q in QUERIES:
+        row = {}
+        for indexed in (False, True):
+            search_db.has_search_index = lambda: indexed
+            samples, results = time_search(q, country, rounds)
+            totals[indexed].extend(samples)
+            row[indexed] = (percentile(samples, 0.5), percentile(samples, 0.99), results[0]['name'] if results else '-')
+
+        like, fts = row[False], row[True]
+        speedup = like[0] / fts[0] if fts[0] else 0
+        print(f"{q:<28}{like[0]:>9.1f}ms{like[1]:>7.1f}ms{fts[0]:>9.1f}ms{fts[1]:>7.1f}ms{speedup:>8.1f}x  {like[2]} / {fts[2]}")
+
+    for indexed, label in ((False, 'LIKE'), (True, 'FTS')):
+        samples = sorted(totals[indexed])
+        print(f"\n{label}: p50 {percentile(samples, 0.5):.1f} ms, p99 {percentile(samples, 0.99):.1f} ms over {len(samples)} searches", end="")
+    print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--country", default="")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not search_db.has_search_index():
+            use_indexed_copy(tmp_dir)
+        main(args.rounds, args.country)
+        locations_db.close_connections()
@@ -0,0 +1,102 @@
+'''
+benchmark: requests/sec on /hotspots/search and /hotspots/browse-hotspots with the pooled
+read-only sqlite layer vs a fresh connection per query (how the routes worked before).
+
+runs the real hotspots router in-process (no server, no lifespan), from the repo root:
+    PYTHONPATH=server python server/benchmarks/bench_locations_db.py
+    PYTHONPATH=server python server/benchmarks/bench_locations_db.py --requests 2000 --concurrency 16
+
+or against a running server (e.g. an older checkout) with --url http://localhost:8000
+'''
+import argparse
+import asyncio
+import sqlite3
+import time
+import httpx
+
+SEARCH_QUERIES = ["park", "lake", "central park", "bosque", "reserva natural", "river trail", "marsh", "beach"]
+
+def build_paths(num_requests):
+    paths = []
+    for i in range(num_requests):
+        if i % 2:
+            paths.append(f"/hotspots/search?hotspot={SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}&mode=hotspot")
+        else:
+            paths.append(f"/hotspots/browse-hotspots?limit=20&offset={(i * 20) % 2000}")
+    return paths
+
+async def run(client, paths, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = {"search": [], "browse-hotspots": []}
+
+    async def hit(path):
+        async with sem:
+            start = time.perf_counter()
+            res = await client.get(path)
+            elapsed = time.perf_counter() - start
+            if res.status_code >= 500:
+                raise RuntimeError(f"{path} -> {res.status_code}")
+            latencies["search" if "/search" in path else "browse-hotspots"].append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(hit(p) for p in paths))
+    total = time.perf_counter() - start
+    return total, latencies
+
+def report(label, total, latencies, num_requests):
+    print(f"\n[{label}] {num_requests} requests in {total:.2f}s -> {num_requests / total:.0f} req/s")
+    for endpoint, samples in latencies.items():
+        if samples:
+            samples.sort()
+            p50 = samples[len(samples) // 2] * 1000
+            p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+            print(f"    /hotspots/{endpoint}: {len(samples) / sum(samples):.0f} req/s per connection, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+def in_process_app():
+    from fastapi import FastAPI
+    from routes import hotspots
+    app = FastAPI()
+    app.include_router(hotspots.router)
+    return app
+
+async def bench_in_process(num_requests, concurrency):
+    from services import locations_db, search_db
+
+    # repeated queries would be answered by the autocomplete cache, measure the database instead
+    search_db.SEARCH_CACHE = None
+
+    app = in_process_app()
+    paths = build_paths(num_requests)
+    pooled_get_connection = locations_db.get_connection
+
+    # previous behavior: a new read-write connection for every query
+    def fresh_connection():
+        return sqlite3.connect(locations_db.DB_FILE)
+
+    for label, get_connection in (("fresh connection per query", fresh_connection), ("pooled read-only", pooled_get_connection)):
+        locations_db.get_connection = get_connection
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            await run(client, paths[:20], concurrency)  # warm up
+            total, latencies = await run(client, paths, concurrency)
+        report(label, total, latencies, num_requests)
+
+    locations_db.get_connection = pooled_get_connection
+
+async def bench_url(url, num_requests, concurrency):
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        paths = build_paths(num_requests)
+        await run(client, paths[:20], concurrency)
+        total, latencies = await run(client, paths, concurrency)
+    report(url, total, latencies, num_requests)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process router")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_url(args.url, args.requests, args.concurrency))
+    else:
+        asyncio.run(bench_in_process(args.requests, args.concurrency))
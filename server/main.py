@@ -10,6 +10,11 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from services.database_sync import sync_data
 from services.browser_manager import close_browser
+from services.ranking_engine.fetch_barcharts import close_http_client
+from services.ranking_engine.executor import shutdown_executor
+from services.ebird_api import close_api_client
+from services.locations_db import close_connections
+from services.metadata_store import close_store
 import os
 from contextlib import asynccontextmanager
 from datetime import datetime
@@ -39,6 +44,19 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"[Database] Failed to enable WAL mode: {e}")
 
+    # full-text index for hotspot name search, only database_sync builds it (the app opens locations.db read-only)
+    from services.search_db import has_search_index
+    if not has_search_index():
+        print("[Database] | no hotspot search index yet, using LIKE search until the next sync "
+              "(or run: PYTHONPATH=server python server/services/database_sync.py --migrate)")
+    # coordinates + R*Tree for /hotspots/nearby, filled by database_sync from the eBird API
+    from services.nearby_hotspots import has_geo_index
+    if not has_geo_index():
+        print("[Database] | hotspot geo index not populated, /hotspots/nearby is unavailable until the next sync")
+    # taxonomy lookup index for species enrichment, built once here instead of on the first report
+    from services.bird_metadata import load_taxonomy
+    load_taxonomy()
+
     # start scheduler on app startup
     scheduler = AsyncIOScheduler()
     trigger = CronTrigger(
@@ -63,7 +81,12 @@ async def lifespan(app: FastAPI):
     # cleanup on shutdown
     await job_manager.stop_worker()
     scheduler.shutdown()
+    await close_http_client()
+    await close_api_client()
     await close_browser()
+    shutdown_executor()
+    close_connections()
+    close_store()
 
 
 app = FastAPI(lifespan=lifespan)
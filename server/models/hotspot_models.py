@@ -8,4 +8,9 @@ class HotspotOverview(BaseModel):
     country: str
     subregion1: Optional[str] = None
     subregion2: Optional[str] = None
-    speciesCount: int # Found @ "species list for a region" under "product"
\ No newline at end of file
+    speciesCount: int # Found @ "species list for a region" under "product"
+
+class NearbyHotspot(HotspotOverview):
+    lat: float
+    lng: float
+    distanceKm: float
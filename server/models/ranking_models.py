@@ -10,4 +10,8 @@ class DetailedHotspot(BaseModel):
     subregion2: Optional[str] = None
     total_sample_size: float
     sample_sizes_by_week: dict[str, float]
-    birds:List[Bird]#list of bird species with data
+    total_species: Optional[int] = None # species count before any top_k cut
+    birds:List[Bird]#list of bird species with data (the requested page)
+    offset: int = 0 # rank offset of the first bird returned
+    limit: Optional[int] = None # page size requested (None = every bird from offset)
+    total_birds: Optional[int] = None # length of the whole ranking
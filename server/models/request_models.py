@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Annotated
+from typing import Optional, Annotated, Literal
 from fastapi import Query
 from datetime import datetime
 
@@ -15,6 +15,13 @@ class HotspotBrowseRequest(BaseModel):
     limit: Annotated[int | None, Query(description="Amount of overviews to return", ge=0, le=100)] = 20
     offset: Annotated[int | None, Query(description="Amount of overviews to skip from start of dataset", ge=0)] = 0
 
+class HotspotNearbyRequest(BaseModel):
+    lat: Annotated[float, Query(description="Latitude of the search center", ge=-90, le=90)]
+    lng: Annotated[float, Query(description="Longitude of the search center", ge=-180, le=180)]
+    radius: Annotated[float, Query(description="Search radius in km", gt=0, le=500)] = 25
+    limit: Annotated[int, Query(description="Amount of hotspots to return", ge=1, le=100)] = 20
+    sort: Annotated[Literal['distance', 'species'], Query(description="Order by distance (default) or species count")] = 'distance'
+
 class RankingFilterRequest(BaseModel):
     start_yr: int | None = Query(None, description="Start year for data range")
     end_yr: int | None = Query(None, description="End year for data range")
@@ -9,3 +9,8 @@ class Bird(BaseModel):
     birdCode: Optional[str] = None
     speciesUrl: Optional[str] = None
     imageUrl: Optional[str] = None
+    imagePending: bool = False # image is being fetched in the background, poll /species/images
+
+class SpeciesImageStatus(BaseModel):
+    imageUrl: Optional[str] = None
+    pending: bool = False
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, HTTPException, Path, Query
 from fastapi.responses import StreamingResponse
-from services.search_db import dynamic_search
+from services.search_db import dynamic_search, get_search_stats
 from services.fetch_hotspots import (detailed_hotspot_data,get_overviews)
+from services.nearby_hotspots import get_nearby_hotspots, has_geo_index
 from services.database_sync import sync_data
 from services.database_sync import sync_data
 from services.pdf_export import generate_pdf
-from models.hotspot_models import HotspotOverview
+from models.hotspot_models import HotspotOverview, NearbyHotspot
 from models.ranking_models import DetailedHotspot
-from models.request_models import HotspotSearchRequest, HotspotBrowseRequest, RankingFilterRequest
+from models.request_models import HotspotSearchRequest, HotspotBrowseRequest, HotspotNearbyRequest, RankingFilterRequest
 from datetime import datetime
 import json
 import os
@@ -54,6 +55,14 @@ async def location_search(request: HotspotSearchRequest = Depends()):
         raise HTTPException(status_code=404, detail="Location not found.")
     return {"results" : data}
 
+'''
+Hotspot search cache stats: size, hits / narrowed / misses, hit ratio and p50/p99 latency (ms)
+of recent searches by outcome. Used to size SEARCH_CACHE_SIZE.
+'''
+@router.get("/search/stats")
+async def location_search_stats():
+    return get_search_stats()
+
 '''
 Background script that updates hotspot overview data monthly.
 Scheduler is configured in main.py using APScheduler.
@@ -86,16 +95,44 @@ async def browse_hotspots(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid Input: {e}")
 
+'''
+Hotspots near a point ("best hotspots near me"), answered from the geo index.
+    lat, lng- search center
+    radius- search radius in km (default 25, max 500)
+    sort- 'distance' (nearest first, then most species) or 'species' (most species first, then nearest)
+
+503 until a database sync has filled in hotspot coordinates.
+'''
+@router.get("/nearby", response_model=List[NearbyHotspot])
+async def nearby_hotspots(
+    request: HotspotNearbyRequest = Depends()
+    ):
+
+    if not has_geo_index():
+        raise HTTPException(status_code=503, detail="Nearby search unavailable: hotspot coordinates have not been synced yet.")
+
+    data = get_nearby_hotspots(request.lat, request.lng, request.radius, request.limit, request.sort)
+
+    if not data:
+        raise HTTPException(status_code=404, detail="No Hotspots Found.")
+    return data
+
 '''
 Provides detailed hotspot overview with optional month/week filtering.
 
 Returns:
 -hotspot id,name,region,location, and list of ranked birds for the given hotspot
+-top_k (optional): only the K most frequent species are ranked and returned, total_species still counts all of them
+-offset/limit (optional): return (and look up codes, links and images for) only that page of the ranking,
+ total_birds is the length of the whole ranking. other pages are served from the same cached ranking.
 '''
 @router.get("/report/{hotspotId}", response_model=DetailedHotspot)
 async def get_detailed_hotspot_data(
     hotspotId: str,
-    filters: RankingFilterRequest = Depends()
+    filters: RankingFilterRequest = Depends(),
+    top_k: int | None = Query(None, ge=1, description="Only rank and return the top K species"),
+    offset: int = Query(0, ge=0, description="Rank offset of the first bird to return"),
+    limit: int | None = Query(None, ge=1, description="Number of birds to return (default: all)")
 ):
     print(f"Received request for hotspotID: {hotspotId}")
     try:
@@ -104,7 +141,7 @@ async def get_detailed_hotspot_data(
         raise HTTPException(status_code=400, detail=str(e))
 
     # if the user just viewed report, serve from RAM
-    from services.fetch_hotspots import HOTSPOT_CACHE, get_cache_key
+    from services.fetch_hotspots import HOTSPOT_CACHE, get_cache_key, get_report_page
     cache_key = get_cache_key(
         hotspotId, 
         filters.start_yr, 
@@ -112,25 +149,58 @@ async def get_detailed_hotspot_data(
         filters.start_month, 
         filters.start_week, 
         filters.end_month, 
-        filters.end_week
+        filters.end_week,
+        top_k
     )
     
     if cache_key in HOTSPOT_CACHE:
         print(f"[cache] | FAST PATH for {hotspotId} - returning cached result")
-        return HOTSPOT_CACHE[cache_key]
+        return await get_report_page(HOTSPOT_CACHE[cache_key], offset, limit)
         
     from services.job_queue import job_manager, JobType
+    from services.fetch_hotspots import has_parsed_barchart
     from fastapi.responses import JSONResponse
 
+    # barchart already parsed in memory: re-filtering is pure cpu, answer in this request
+    cached = has_parsed_barchart(hotspotId, filters.start_yr, filters.end_yr)
+    if cached:
+        try:
+            result = await detailed_hotspot_data(
+                hotspotID=hotspotId,
+                start_yr=filters.start_yr,
+                end_yr=filters.end_yr,
+                start_month=filters.start_month,
+                start_week=filters.start_week,
+                end_month=filters.end_month,
+                end_week=filters.end_week,
+                top_k=top_k,
+                offset=offset,
+                limit=limit
+            )
+            if result:
+                print(f"[cache] | INLINE re-filter for {hotspotId} - returning result directly")
+                return result
+        except Exception as e:
+            print(f"[cache] | inline re-filter failed for {hotspotId}, falling back to job queue: {e}")
+
+    # re-filters that could not be served inline still skip the network lane
+    lane = "interactive" if cached else None
+
+    # identical in-flight reports share one job
     job_id = await job_manager.enqueue_job(
         JobType.FETCH_HOTSPOT_REPORT,
+        dedup_key=f"report:{cache_key}:{offset}:{limit}",
+        lane=lane,
         hotspot_id=hotspotId,
         start_yr=filters.start_yr,
         end_yr=filters.end_yr,
         start_month=filters.start_month,
         start_week=filters.start_week,
         end_month=filters.end_month,
-        end_week=filters.end_week
+        end_week=filters.end_week,
+        top_k=top_k,
+        offset=offset,
+        limit=limit
     )
     
     return JSONResponse(
@@ -182,6 +252,7 @@ async def get_report_pdf(
 
     job_id = await job_manager.enqueue_job(
         JobType.GENERATE_PDF,
+        dedup_key=f"pdf:{cache_key}",
         client_url=client_url,
         hotspot_id=hotspotId,
         num_top_birds=num_top_birds,
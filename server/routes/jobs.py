@@ -1,11 +1,29 @@
 from fastapi import APIRouter, HTTPException
-from services.job_queue import job_manager
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from services.job_queue import job_manager, JobStatus
+import asyncio
+import json
 
 router = APIRouter(
     prefix="/jobs",
     tags=["Jobs"]
 )
 
+# seconds between keep-alive comments so proxies don't drop idle streams
+KEEPALIVE_INTERVAL = 15
+
+def format_event(event):
+    event = jsonable_encoder(event)
+    return f"event: {event['status']}\ndata: {json.dumps(event)}\n\n"
+
+# declared before /{job_id} so "metrics" isn't read as a job id
+@router.get("/metrics")
+async def get_job_metrics():
+    # per lane load, per job type queue wait vs run time, and ranking stage timings
+    from services.ranking_engine.executor import get_stage_stats
+    return {**job_manager.get_metrics(), "stages": get_stage_stats()}
+
 @router.get("/{job_id}")
 async def get_job_status(job_id: str):
     # get current status of job
@@ -13,3 +31,37 @@ async def get_job_status(job_id: str):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     return job
+
+'''
+server-sent events for a job: one event per state transition
+(queued -> processing -> completed/failed) plus queue position updates while queued.
+the result is sent once, in the final event, and the stream closes after it.
+'''
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    job = job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        # subscribe before reading the current state so no transition is missed
+        listener = job_manager.subscribe(job_id)
+        try:
+            event = job_manager.get_event(job)
+            yield format_event(event)
+
+            while event["status"] not in (JobStatus.COMPLETED, JobStatus.FAILED):
+                try:
+                    event = await asyncio.wait_for(listener.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            job_manager.unsubscribe(job_id, listener)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -18,28 +18,34 @@ SESSION_FILE = os.getenv('SESSION_FILE')
 @router.get('/ranking/{loc}')
 async def fetch_ranking_data(
     loc: str,
-    filters: RankingFilterRequest = Depends()
+    filters: RankingFilterRequest = Depends(),
+    top_k: int | None = Query(None, ge=1, description="Only rank and return the top K species")
 ):
     """
     get ranked bird species for a location with optional month/week filtering.
     
     example: /ranking/L901084?start_month=5&start_week=1&end_month=9&end_week=2
     (gets birds for May week 1 through September week 2)
+
+    top_k limits the ranking to the K most frequent species (total_species still counts all).
     """
     try:
         filters.validate_years()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    # identical in-flight rankings share one job
     job_id = await job_manager.enqueue_job(
         JobType.FETCH_BARCHARTS,
+        dedup_key=f"ranking:{loc}:{filters.start_yr}:{filters.end_yr}:{filters.start_month}:{filters.start_week}:{filters.end_month}:{filters.end_week}:{top_k}",
         loc=loc,
         start_yr=filters.start_yr,
         end_yr=filters.end_yr,
         start_month=filters.start_month,
         start_week=filters.start_week,
         end_month=filters.end_month,
-        end_week=filters.end_week
+        end_week=filters.end_week,
+        top_k=top_k
     )
     
     return JSONResponse(
@@ -1,6 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict
 from playwright.async_api import async_playwright
-from services.bird_metadata import get_species_image_url
+from services.bird_metadata import get_species_image_url, get_image_status
+from models.species_models import SpeciesImageStatus
+
+# most species codes one /species/images request may ask about
+MAX_IMAGE_CODES = 100
 
 
 router = APIRouter(
@@ -21,6 +26,7 @@ async def get_bird_image(bird_code: str):
 
     job_id = await job_manager.enqueue_job(
         JobType.FETCH_IMAGE,
+        dedup_key=f"image:{bird_code}",
         bird_code=bird_code
     )
     
@@ -32,3 +38,21 @@ async def get_bird_image(bird_code: str):
             "message": "Image fetch enqueued. Poll /jobs/{jobId} for results."
         }
     )
+
+
+@router.get("/images", response_model=Dict[str, SpeciesImageStatus])
+async def get_bird_images(
+    codes: str = Query(..., description="Comma separated species codes, e.g. norcar,amerob")
+):
+    '''
+    current image url per species code, and whether a background fetch is still pending.
+    lets clients fill in report birds marked imagePending without one job per image.
+    '''
+    bird_codes = list(dict.fromkeys(code.strip() for code in codes.split(',') if code.strip()))
+
+    if not bird_codes:
+        raise HTTPException(status_code=400, detail="No species codes given.")
+    if len(bird_codes) > MAX_IMAGE_CODES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGE_CODES} species codes per request.")
+
+    return get_image_status(bird_codes)
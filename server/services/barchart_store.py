@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import numpy as np
+from datetime import datetime
+from services.ranking_engine.rank_calculator import ParsedBarchart
+
+'''
+persistent on-disk store for parsed eBird barcharts so fetched data survives restarts/deploys.
+
+rows are keyed by (locId, start_yr, end_yr) and hold zlib-compressed parsed matrices
+(species names, float32 frequency matrix, sample sizes) plus the time they were fetched.
+
+staleness policy (a stale barchart is still served when refetching it fails):
+    - ranges that include the current year keep getting new checklists -> BARCHART_STORE_TTL_HOURS (default 24)
+    - ranges that ended in a past year barely change -> BARCHART_STORE_ARCHIVE_TTL_DAYS (default 30)
+    - single past years (the slices BARCHART_FETCH_MODE=yearly composes ranges from) fetched after the year ended
+      are closed -> never refetched (fetched while the year was running -> BARCHART_STORE_TTL_HOURS)
+'''
+
+STORE_FILE = os.getenv('BARCHART_STORE_FILE', 'server/data/database/barcharts.db')
+CURRENT_TTL = float(os.getenv('BARCHART_STORE_TTL_HOURS', '24')) * 3600
+ARCHIVE_TTL = float(os.getenv('BARCHART_STORE_ARCHIVE_TTL_DAYS', '30')) * 86400
+
+# bumped when the stored representation changes, older rows are treated as stale
+STORE_FORMAT = 1
+
+_initialized = False
+
+def _connect():
+    global _initialized
+    sqlConn = sqlite3.connect(STORE_FILE, timeout=30)
+
+    if not _initialized:
+        sqlConn.execute("PRAGMA journal_mode=WAL")
+        sqlConn.execute('''CREATE TABLE IF NOT EXISTS barcharts (
+            loc_id TEXT NOT NULL,
+            start_yr INTEGER NOT NULL,
+            end_yr INTEGER NOT NULL,
+            species BLOB NOT NULL,
+            freq BLOB NOT NULL,
+            sample_sizes BLOB NOT NULL,
+            month_row TEXT NOT NULL,
+            raw_nbytes INTEGER NOT NULL DEFAULT 0,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (loc_id, start_yr, end_yr)
+        )''')
+        # rows stored before STORE_FORMAT had their trailing empty weeks dropped,
+        # mark them stale so they are refetched (still served if that fails)
+        if sqlConn.execute("PRAGMA user_version").fetchone()[0] < STORE_FORMAT:
+            sqlConn.execute("UPDATE barcharts SET fetched_at = 0")
+            sqlConn.execute(f"PRAGMA user_version = {STORE_FORMAT}")
+        sqlConn.commit()
+        _initialized = True
+
+    return sqlConn
+
+def get_ttl(start_yr, end_yr, fetched_at):
+    """how long a stored barchart stays fresh (None = forever), based on whether its range was still collecting data when fetched"""
+    if end_yr >= datetime.now().year:
+        return CURRENT_TTL
+    # a single year is only closed if it was fetched after it ended, otherwise it holds partial data
+    if start_yr == end_yr:
+        return None if datetime.fromtimestamp(fetched_at).year > end_yr else CURRENT_TTL
+    return ARCHIVE_TTL
+
+def is_stale(start_yr, end_yr, fetched_at):
+    ttl = get_ttl(start_yr, end_yr, fetched_at)
+    return ttl is not None and time.time() - fetched_at > ttl
+
+def encode_barchart(barchart):
+    """compress a ParsedBarchart into blobs for the store"""
+    return (
+        zlib.compress(json.dumps(barchart.species.tolist()).encode('utf-8')),
+        zlib.compress(barchart.freq.astype(np.float32).tobytes()),
+        zlib.compress(barchart.sample_sizes.astype(np.float64).tobytes()),
+        json.dumps(list(barchart.month_row)),
+    )
+
+def decode_barchart(species, freq, sample_sizes, month_row, raw_nbytes=0):
+    """rebuild a ParsedBarchart from stored blobs"""
+    species = np.array(json.loads(zlib.decompress(species).decode('utf-8')), dtype=object)
+    sample_sizes = np.frombuffer(zlib.decompress(sample_sizes), dtype=np.float64).copy()
+    freq = np.frombuffer(zlib.decompress(freq), dtype=np.float32).reshape(len(species), len(sample_sizes)).copy()
+    return ParsedBarchart(species, freq, sample_sizes, json.loads(month_row), raw_nbytes=raw_nbytes)
+
+def load_barchart(loc_id, start_yr, end_yr, allow_stale=False):
+    """
+    read a stored barchart.
+
+    returns: ParsedBarchart, or None if missing (or stale, unless allow_stale)
+    """
+    sqlConn = None
+    try:
+        sqlConn = _connect()
+        row = sqlConn.execute(
+            "SELECT species, freq, sample_sizes, month_row, raw_nbytes, fetched_at FROM barcharts WHERE loc_id = ? AND start_yr = ? AND end_yr = ?",
+            (loc_id, start_yr, end_yr)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        if not allow_stale and is_stale(start_yr, end_yr, row[5]):
+            print(f"[store] | stale barchart for {loc_id} {start_yr}-{end_yr} (fetched {datetime.fromtimestamp(row[5]).isoformat()})")
+            return None
+
+        return decode_barchart(*row[:5])
+
+    except (sqlite3.Error, ValueError, zlib.error) as e:
+        print(f"[store] | failed to load barchart for {loc_id}: {e}")
+        return None
+
+    finally:
+        if sqlConn:
+            sqlConn.close()
+
+def save_barchart(loc_id, start_yr, end_yr, barchart, fetched_at=None):
+    """write (or replace) a barchart in the store"""
+    sqlConn = None
+    try:
+        species, freq, sample_sizes, month_row = encode_barchart(barchart)
+
+        sqlConn = _connect()
+        with sqlConn:
+            sqlConn.execute(
+                "INSERT OR REPLACE INTO barcharts (loc_id, start_yr, end_yr, species, freq, sample_sizes, month_row, raw_nbytes, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (loc_id, start_yr, end_yr, species, freq, sample_sizes, month_row, barchart.raw_nbytes, fetched_at or time.time())
+            )
+
+        stored_kb = (len(species) + len(freq) + len(sample_sizes)) / 1024
+        print(f"[store] | saved barchart for {loc_id} {start_yr}-{end_yr} ({stored_kb:.0f} KB compressed)")
+        return True
+
+    except sqlite3.Error as e:
+        print(f"[store] | failed to save barchart for {loc_id}: {e}")
+        return False
+
+    finally:
+        if sqlConn:
+            sqlConn.close()
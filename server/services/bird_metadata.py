@@ -2,41 +2,46 @@ import csv
 import os
 import json
 import asyncio
-from rapidfuzz import fuzz
-from playwright.async_api import async_playwright
+from rapidfuzz import fuzz, process
+from cachetools import TTLCache
+from services import metadata_store
+from services.metadata_store import METADATA_CACHE_FILE
 
 TAXONOMY_FILE = 'server/data/eBird_taxonomy_v2025.csv'
-METADATA_CACHE_FILE = 'server/data/bird_metadata_cache.json'
 
-## cache
+## cache (in memory: resolved names and image urls seen by this process, backed by metadata_store)
 _bird_cache = {}
 _taxonomy_list = []
 
-def load_metadata_cache():
-    # loads json cache and populates _bird_cache
-    global _bird_cache
-    if os.path.exists(METADATA_CACHE_FILE):
-        try:
-            with open(METADATA_CACHE_FILE, 'r') as f:
-                data = json.load(f)
-                for code, info in data.items():
-                    # cache image url
-                    if info.get('imageUrl'):
-                        _bird_cache[f"img_{code}"] = info['imageUrl']
-                    # cache bird code lookup (name / code)
-                    if info.get('comName'):
-                        _bird_cache[info['comName']] = (code, info.get('speciesUrl'))
-                
-                print(f"[info] | loaded {len(data)} items from metadata cache")
-        except Exception as e:
-            print(f"[warning] | failed to load cache: {e}")
-
-# attempt load on import
-load_metadata_cache()
+## taxonomy index: normalized name / scientific name / species code -> species code
+_taxonomy_index = {}
+# species common names for the fuzzy fallback, in taxonomy order
+_fuzzy_names = []
+_fuzzy_codes = []
+
+# ranks whose missing images are fetched (in the background) for every served report
+TOP_IMAGE_COUNT = 3
+# species whose image lookup just failed aren't queued again for an hour
+_image_misses = TTLCache(maxsize=5000, ttl=3600)
+
+FUZZY_CUTOFF = 85
+# rows whose names resolve to the species in REPORT_AS (e.g. "Mallard (Domestic type)")
+ALTERNATE_CATEGORIES = ('issf', 'form', 'domestic', 'intergrade')
+
+def load_image_urls(codes):
+    # pulls stored image urls for these codes into _bird_cache (one store query)
+    missing = [code for code in codes if code and f"img_{code}" not in _bird_cache]
+    if not missing:
+        return
+    for code, image_url in metadata_store.get_image_urls(missing).items():
+        _bird_cache[f"img_{code}"] = image_url
+
+def normalize_name(name):
+    return ' '.join(name.lower().split())
 
 def load_taxonomy():
-    # loads taxonomy csv into memory
-    global _taxonomy_list
+    # loads taxonomy csv into memory and builds the lookup index (once)
+    global _taxonomy_list, _taxonomy_index, _fuzzy_names, _fuzzy_codes
     if _taxonomy_list:
         return _taxonomy_list
 
@@ -48,17 +53,37 @@ def load_taxonomy():
     
     try:
         loaded_birds = []
+        alternates = []
         with open(TAXONOMY_FILE, mode='r', encoding='utf-8-sig') as f:
             reader = csv.DictReader(f)
             for row in reader:
                 if row.get('CATEGORY') == 'species':
                     loaded_birds.append({
                         'comName': row['PRIMARY_COM_NAME'],
-                        'code': row['SPECIES_CODE']
+                        'code': row['SPECIES_CODE'],
+                        'sciName': row.get('SCI_NAME') or ''
                     })
-        
+                elif row.get('CATEGORY') in ALTERNATE_CATEGORIES and row.get('REPORT_AS'):
+                    alternates.append((row['PRIMARY_COM_NAME'], row.get('SCI_NAME') or '', row['REPORT_AS']))
+
+        index = {}
+        # species common names win over everything else, then codes, scientific names and alternates
+        for bird in loaded_birds:
+            index.setdefault(normalize_name(bird['comName']), bird['code'])
+        for bird in loaded_birds:
+            index.setdefault(bird['code'].lower(), bird['code'])
+            if bird['sciName']:
+                index.setdefault(normalize_name(bird['sciName']), bird['code'])
+        for com_name, sci_name, report_as in alternates:
+            index.setdefault(normalize_name(com_name), report_as)
+            if sci_name:
+                index.setdefault(normalize_name(sci_name), report_as)
+
+        _taxonomy_index = index
+        _fuzzy_names = [normalize_name(bird['comName']) for bird in loaded_birds]
+        _fuzzy_codes = [bird['code'] for bird in loaded_birds]
         _taxonomy_list = loaded_birds
-        print(f"[info] | loaded {len(_taxonomy_list)} species from CSV")
+        print(f"[info] | loaded {len(_taxonomy_list)} species from CSV ({len(_taxonomy_index)} lookup keys)")
         return _taxonomy_list
 
     except Exception as e:
@@ -77,34 +102,45 @@ def get_bird_code(species_name):
     if not birds:
         return None, None
 
-    ## exact match
-    species_lower = species_name.lower()
-    for bird in birds:
-        if bird['comName'].lower() == species_lower:
-            result = (bird['code'], build_species_url(bird['code']))
-            _bird_cache[species_name] = result
-            return result
-
-    ## fuzzy fallback 
-    best_match = None
-    best_score = 0
-    
-    for bird in birds:
-        score = fuzz.ratio(species_lower, bird['comName'].lower())
-        if score > 85: 
-            if score > best_score:
-                best_score = score
-                best_match = bird['code']
-            if score == 100: 
-                break
+    ## exact match (common, alternate or scientific name, or a species code)
+    species_key = normalize_name(species_name)
+    code = _taxonomy_index.get(species_key)
+
+    ## fuzzy fallback, best ratio over every species name in one call
+    if not code:
+        match = process.extractOne(species_key, _fuzzy_names, scorer=fuzz.ratio, score_cutoff=FUZZY_CUTOFF)
+        # the old scan only accepted scores strictly above the cutoff
+        if match and match[1] > FUZZY_CUTOFF:
+            code = _fuzzy_codes[match[2]]
+
+    result = (code, build_species_url(code)) if code else (None, None)
+    _bird_cache[species_name] = result
+    return result
+
+# block requests to save bandwidth
+async def block_media(route):
+    if route.request.resource_type in ["image", "stylesheet", "font", "media"]:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def scrape_species_image(bird_code, browser_page):
+    # reads the main photo off the species page (no caching), navigation errors are raised
+    url = build_species_url(bird_code)
+    print(f"[debug] | navigating to {url}...")
+
+    await browser_page.goto(url, timeout=15000, wait_until='domcontentloaded')
     
-    if best_match:
-        result = (best_match, build_species_url(best_match))
-        _bird_cache[species_name] = result
-        return result
+    selector = 'img.Species-media-image'
+    try:
+        await browser_page.wait_for_selector(selector, timeout=6000)
+        img = await browser_page.query_selector(selector)
+        if img:
+            return await img.get_attribute('src')
+    except Exception as e:
+        print(f"[warning] | timeout waiting for image selector for {bird_code}: {e}")
         
-    _bird_cache[species_name] = (None, None)
-    return None, None
+    return None
 
 async def get_species_image_url(bird_code, browser_page=None):
     # scrapes image url via playwright
@@ -115,202 +151,124 @@ async def get_species_image_url(bird_code, browser_page=None):
     if cache_key in _bird_cache and _bird_cache[cache_key] is not None:
         return _bird_cache[cache_key]
 
+    stored = metadata_store.get_image_url(bird_code)
+    if stored:
+        _bird_cache[cache_key] = stored
+        return stored
+
     print(f"[info] | fetching image for {bird_code}...")
 
     try:
-        url = build_species_url(bird_code)
-        print(f"[debug] | navigating to {url}...")
-        
-        # block requests to save bandwidth
-        async def route_intercept(route):
-            if route.request.resource_type in ["image", "stylesheet", "font", "media"]:
-                await route.abort()
-            else:
-                await route.continue_()
-        
-        await browser_page.route("**/*", route_intercept)
+        await browser_page.route("**/*", block_media)
 
-        await browser_page.goto(url, timeout=15000, wait_until='domcontentloaded')
-        
-        selector = 'img.Species-media-image'
-        try:
-            await browser_page.wait_for_selector(selector, timeout=6000)
-            img = await browser_page.query_selector(selector)
-            if img:
-                src = await img.get_attribute('src')
-                _bird_cache[cache_key] = src
-                print(f"[success] | found image for {bird_code}: {src[:80]}...")
-                return src
-        except Exception as e:
-            print(f"[warning] | timeout waiting for image selector for {bird_code}: {e}")
-            pass 
+        src = await scrape_species_image(bird_code, browser_page)
+        if src:
+            _bird_cache[cache_key] = src
+            metadata_store.save_metadata(bird_code, image_url=src)
+            print(f"[success] | found image for {bird_code}: {src[:80]}...")
+            return src
             
+        _image_misses[bird_code] = True
         return None
 
     except Exception as e:
         print(f"[error] | image fetch error {bird_code}: {e}")
+        _image_misses[bird_code] = True
         return None
 
-async def enrich_data(species_list):
-    # populates image urls for top 3 birds (uses shared browser)
-    enriched = []
+async def request_image(bird_code):
+    # queues a background image lookup (one in-flight job per species), false if it just failed
+    if bird_code in _image_misses:
+        return False
+    from services.job_queue import job_manager, JobType
+    await job_manager.enqueue_job(JobType.FETCH_IMAGE, dedup_key=f"image:{bird_code}", bird_code=bird_code)
+    return True
+
+def is_image_pending(bird_code):
+    from services.job_queue import job_manager
+    return job_manager.is_inflight(f"image:{bird_code}")
+
+async def enrich_data(species_list, start=0):
+    # populates bird codes, urls and cached images, never waits on a browser
+    # top 3 birds without a cached image are marked imagePending and fetched by the image job lane
+    # start: rank offset of species_list in the full ranking (so a later page doesn't count as top 3)
     load_taxonomy()
-    
-    browser = None
-    page = None
-    
-    # check if we need to open browser
-    # logic: only open if we have top 3 birds that are NOT in cache
-    should_launch = False
-    
-    for i in range(min(3, len(species_list))):
-        rec = species_list[i]
-        s_name = rec.get('Species')
-        if s_name:
-            # try to resolve code to check cache
-            b_code, _ = get_bird_code(s_name)
-            if b_code:
-                cache_key = f"img_{b_code}"
-                if cache_key not in _bird_cache:
-                    should_launch = True
-                    break
-            else:
-                # probably a very obscure bird, skip it
-                pass
-
-    # async context manager handles pulling up and tearing down browser
-    if should_launch:
-        from services.browser_manager import get_browser
-        try:
-            print(f"[info] | using shared browser for image fetching...")
-            browser = await get_browser()
-            page = await browser.new_page(user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        except Exception as e:
-            print(f"[error] | failed to get browser: {e}")
-            import traceback
-            traceback.print_exc()
-            page = None
-
-        try:
-            for idx, record in enumerate(species_list):
-                species_name = record.get('Species', '')
-                
-                if species_name:
-                    # get code
-                    bird_code, species_url = get_bird_code(species_name)
-                    
-                    record['birdCode'] = bird_code
-                    record['speciesUrl'] = species_url
-                    
-                    # get image for top 3 birds
-                    cache_key = f"img_{bird_code}"
-                    
-                    if idx < 3 and bird_code:
-                        # check cache first
-                        if cache_key in _bird_cache:
-                            record['imageUrl'] = _bird_cache[cache_key]
-                        elif page:
-                            print(f"[info] | fetching image for top bird #{idx+1}: {species_name}")
-                            record['imageUrl'] = await get_species_image_url(bird_code, browser_page=page)
-                        else:
-                            record['imageUrl'] = None
-                    else:
-                        # outside top 3, check cache only
-                        if cache_key in _bird_cache:
-                            record['imageUrl'] = _bird_cache[cache_key]
-                        else:
-                            record['imageUrl'] = None
-                else:
-                    record['birdCode'] = None
-                    record['speciesUrl'] = None
-                    record['imageUrl'] = None
-                
-                enriched.append(record)
-        
-        finally:
-            if page:
-                await page.close()
-    else:
-        # were cached, dont need to launch browser
-        for idx, record in enumerate(species_list):
-            species_name = record.get('Species', '')
-            if species_name:
-                bird_code, species_url = get_bird_code(species_name)
-                record['birdCode'] = bird_code
-                record['speciesUrl'] = species_url
-                cache_key = f"img_{bird_code}"
-                if cache_key in _bird_cache:
-                    record['imageUrl'] = _bird_cache[cache_key]
-                else:
-                    record['imageUrl'] = None
-            else:
-                record['birdCode'] = None
-                record['speciesUrl'] = None
-                record['imageUrl'] = None
-            enriched.append(record)
+    codes = [get_bird_code(rec['Species'])[0] if rec.get('Species') else None for rec in species_list]
+    # one store query for every image url this list can use
+    load_image_urls(codes)
+
+    enriched = []
+    for idx, (record, bird_code) in enumerate(zip(species_list, codes)):
+        record['birdCode'] = bird_code
+        record['speciesUrl'] = build_species_url(bird_code)
+        record['imageUrl'] = _bird_cache.get(f"img_{bird_code}") if bird_code else None
+        record['imagePending'] = False
+
+        if idx + start < TOP_IMAGE_COUNT and bird_code and not record['imageUrl']:
+            record['imagePending'] = await request_image(bird_code)
+
+        enriched.append(record)
 
     return enriched
 
-async def prefetch_all_metadata(limit=None):
-    # helper to batch pre-fetch all metadata
-    birds = load_taxonomy()
-    if not birds:
-        return
+def get_image_status(codes):
+    # current image url and pending flag per species code (clients poll this for imagePending birds)
+    load_image_urls(codes)
+    return {
+        code: {
+            "imageUrl": _bird_cache.get(f"img_{code}"),
+            "pending": is_image_pending(code)
+        }
+        for code in codes
+    }
 
-    print(f"[info] | starting pre-fetch for {len(birds)} species...")
-    
-    ## load existing cache
-    existing_cache = {}
-    if os.path.exists(METADATA_CACHE_FILE):
-        with open(METADATA_CACHE_FILE, 'r') as f:
-            existing_cache = json.load(f)
-            print(f"[info] | loaded {len(existing_cache)} existing records")
-
-    results = existing_cache.copy()
-    
-    async with async_playwright() as p:
-        print(f"[info] | launching browser...")
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
-
-        to_process = birds[:limit] if limit else birds
-
-        for i, bird in enumerate(to_process):
-            ## save periodically
-            if i > 0 and i % 10 == 0:
-                print(f"[info] | saving progress at {i} records...")
-                with open(METADATA_CACHE_FILE, 'w') as f:
-                    json.dump(results, f, indent=4)
-            
-            species_name = bird['comName']
-            bird_code = bird['code']
+async def fill_pending_images(birds, timeout=20):
+    # waits (up to timeout seconds) for pending images of already enriched birds, for callers
+    # that need the final images up front (pdf export)
+    pending = [bird for bird in birds if bird.get('imagePending')]
+    deadline = asyncio.get_running_loop().time() + timeout
 
-            ## skip if cached
-            if bird_code in results and results[bird_code].get('imageUrl'):
-                continue
+    while pending and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.25)
+        pending = [bird for bird in pending if is_image_pending(bird['birdCode'])]
 
-            print(f"[{i+1}/{len(to_process)}] processing {species_name} ({bird_code})...")
-            
-            try:
-                image_url = await get_species_image_url(bird_code, browser_page=page)
-            except:
-                image_url = None
-            
-            results[bird_code] = {
-                "comName": species_name,
-                "code": bird_code,
+    for bird in birds:
+        if bird.get('imagePending'):
+            bird['imageUrl'] = _bird_cache.get(f"img_{bird['birdCode']}")
+            bird['imagePending'] = is_image_pending(bird['birdCode'])
+    return birds
+
+def export_metadata_json(path=METADATA_CACHE_FILE):
+    # writes the store out as the committed json seed (taxonomy order, same format as before)
+    stored = metadata_store.get_all_metadata()
+    order = [bird['code'] for bird in load_taxonomy()]
+    order += sorted(set(stored) - set(order))
+
+    results = {}
+    for code in order:
+        if code in stored:
+            com_name, image_url = stored[code]
+            results[code] = {
+                "comName": com_name,
+                "code": code,
                 "imageUrl": image_url,
-                "speciesUrl": build_species_url(bird_code)
+                "speciesUrl": build_species_url(code)
             }
 
-        with open(METADATA_CACHE_FILE, 'w') as f:
-            json.dump(results, f, indent=4)
-        print(f"[success] | completed pre-fetch. saved to {METADATA_CACHE_FILE}")
-        
-        await browser.close()
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+    return len(results)
+
+async def enrich_page(species_list, offset=0, limit=None):
+    # enriches copies of one page of a ranking, the (cached) ranking itself stays unenriched
+    end = None if limit is None else offset + limit
+    page = [dict(record) for record in species_list[offset:end]]
+    return await enrich_data(page, start=offset)
+
+async def prefetch_all_metadata(limit=None, restart=False):
+    # refreshes missing/stale species images concurrently (see services/image_prefetch)
+    from services.image_prefetch import run_prefetch
+    await run_prefetch(limit=limit, restart=restart)
 
 if __name__ == "__main__":
     print("starting taxonomy prefetch...")
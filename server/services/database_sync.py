@@ -1,25 +1,60 @@
 import pandas as pd
 import sqlite3
-import os,httpx,asyncio
-from services.search_db import normalize
+import os,httpx,asyncio,time,socket,argparse
+from services.ebird_api import get_api_client
+from services.rate_limit import TokenBucket, RETRY_STATUS, get_retry_delay
+from services.locations_db import query, DB_FILE, SCHEMA_VERSION
+from services.search_db import normalize, SEARCH_INDEX_DDL, REBUILD_SEARCH_INDEX_SQL, clear_search_cache
+from services.nearby_hotspots import rebuild_geo_index
 
-HEADERS = {"X-eBirdApiToken":os.getenv("EBIRD_API_KEY")}
+# countries fetched at once, and the most requests started per second across all of them
+SYNC_CONCURRENCY = int(os.getenv('SYNC_CONCURRENCY', '8'))
+SYNC_RATE_LIMIT = float(os.getenv('SYNC_RATE_LIMIT', '10'))
+SYNC_MAX_RETRIES = int(os.getenv('SYNC_MAX_RETRIES', '4'))
+
+# a sync holding the lease longer than this is assumed dead
+SYNC_LEASE_SECONDS = 6 * 3600
+
+# page cache for the sync connection, rebuilding the search and geo indexes over ~1M rows thrashes the 2 MB default
+SYNC_CACHE_SIZE_KB = 128 * 1024
 
 '''
 Fetches all hotspot overview info for a country.
+Waits for the rate limiter before every attempt, retries 429/5xx and connection errors with backoff.
 
-Returns:  list of dicts with filtered hotspots data
+Returns:  (list of dicts with filtered hotspots data or None if every attempt failed, retries used)
 '''
-async def fetch_country_hotspots(client,country_code):
-    url =f"https://api.ebird.org/v2/ref/hotspot/{country_code}?fmt=json"
+async def fetch_country_hotspots(client,country_code,limiter=None):
+    url = f"/ref/hotspot/{country_code}?fmt=json"
+
+    for attempt in range(SYNC_MAX_RETRIES + 1):
+        if limiter:
+            await limiter.acquire()
+
+        res = None
+        try:
+            res = await client.get(url)
+            if res.status_code in RETRY_STATUS and attempt < SYNC_MAX_RETRIES:
+                delay = get_retry_delay(attempt, res)
+                print(f" [Database Sync] | {country_code}: HTTP {res.status_code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            res.raise_for_status()
 
-    try:
-        res = await client.get(url,headers=HEADERS,timeout=20)
-        res.raise_for_status()
+            data = res.json()
 
-        await asyncio.sleep(0.25)
-        
-        data = res.json()
+        except httpx.TransportError as e:
+            if attempt < SYNC_MAX_RETRIES:
+                delay = get_retry_delay(attempt)
+                print(f" [Database Sync] | {country_code}: {type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            print(f" [Database Sync] | Exception : {e}")
+            return None, attempt
+
+        except Exception as e:
+            print(f" [Database Sync] | Exception : {e}")
+            return None, attempt
 
         filtered = [{
             "id": h['locId'],
@@ -27,101 +62,297 @@ async def fetch_country_hotspots(client,country_code):
             "country": h['countryCode'],
             "subregion1":  h['subnational1Code'] if 'subnational1Code' in h else None,
             "subregion2": h['subnational2Code'] if 'subnational2Code' in h else None,
-            "speciesCount": h['numSpeciesAllTime'] if 'numSpeciesAllTime' in h else 0
+            "speciesCount": h['numSpeciesAllTime'] if 'numSpeciesAllTime' in h else 0,
+            "lat": h.get('lat'),
+            "lng": h.get('lng')
         } for h in data] #list of hotspots in country
 
-    except Exception as e:
-        print(f" [Database Sync] | Exception : {e}")
-        return None
+        return filtered, attempt
 
-    return filtered
+    return None, SYNC_MAX_RETRIES
 
-'''
-Uses ebird api calls to fetch most recent hotspot info for all locations by country
+def get_fetch_order(country_codes):
+    """biggest countries (by hotspots already stored) first so they don't end up as the tail of the sync"""
+    try:
+        sizes = dict(query("SELECT country_code, COUNT(*) FROM hotspots GROUP BY country_code"))
+    except sqlite3.Error:
+        sizes = {}
+    return sorted(country_codes, key=lambda c: sizes.get(c, 0), reverse=True)
 
-Returns: list of dictionaries containing info about each hotspot. Dumps information into a json file.
 '''
-async def sync_data():
- 
-    print("[Background Data Sync] | Database sync started...")
+Fetches every country with at most SYNC_CONCURRENCY requests in flight and SYNC_RATE_LIMIT
+request starts per second, printing progress and per-country timing. Each country's hotspots
+are handed to on_batch as soon as they arrive and not kept afterwards.
 
-    df = pd.read_csv('server/data/countries-Table 1.csv')
-    country_codes = df['country_code'].to_list()
+Returns: (number of hotspots fetched, list of country codes that failed)
+'''
+async def fetch_all_countries(country_codes, on_batch):
+    client = get_api_client()
+    limiter = TokenBucket(SYNC_RATE_LIMIT)
+    sem = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    fetched = 0
+    failed = []
+    timings = []
+    done = 0
+    total = len(country_codes)
+    start = time.perf_counter()
+
+    async def fetch(country):
+        nonlocal done, fetched
+        async with sem:
+            country_start = time.perf_counter()
+            hotspots, retries = await fetch_country_hotspots(client, country, limiter)
+            elapsed = time.perf_counter() - country_start
+
+        done += 1
+        if hotspots is None:
+            failed.append(country)
+            print(f" [Database Sync] | ({done}/{total}) {country}: FAILED after {elapsed:.2f}s")
+            return
+
+        on_batch(hotspots)
+        fetched += len(hotspots)
+        timings.append((elapsed, country))
+        print(f" [Database Sync] | ({done}/{total}) {country}: {len(hotspots)} hotspots in {elapsed:.2f}s" + (f" ({retries} retries)" if retries else ""))
+
+    await asyncio.gather(*(fetch(c) for c in get_fetch_order(country_codes)))
+
+    wall = time.perf_counter() - start
+    slowest = ", ".join(f"{c} {t:.1f}s" for t, c in sorted(timings, reverse=True)[:5])
+    print(f"[Database Sync] | Fetched {fetched} hotspots from {total - len(failed)}/{total} countries in {wall:.1f}s "
+          f"(concurrency {SYNC_CONCURRENCY}, {SYNC_RATE_LIMIT:g} req/s max). Slowest: {slowest}")
+
+    return fetched, failed
+
+#make updates in staging table (names never change on conflict, so norm_name is filled in afterwards for new rows only)
+UPSERT_SQL = '''INSERT INTO 'new_hotspots' (id, name, country_code, subnational1_code, subnational2_code, species_count, lat, lng) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+
+ON CONFLICT(id) DO UPDATE SET species_count = excluded.species_count, lat = excluded.lat, lng = excluded.lng
+WHERE new_hotspots.species_count != excluded.species_count OR new_hotspots.lat IS NOT excluded.lat OR new_hotspots.lng IS NOT excluded.lng
+'''
 
-    all_results = []
+#hotspot_key is a rowid alias, so it (unlike the implicit rowid of a TEXT primary key) survives a VACUUM and can key the search and geo indexes
+STAGING_TABLE_DDL = "CREATE TABLE new_hotspots (hotspot_key INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, name TEXT, country_code TEXT, subnational1_code TEXT,  subnational2_code TEXT, species_count INTEGER, norm_name TEXT, lat REAL, lng REAL) "
 
-    async with httpx.AsyncClient() as client:
-        for country in country_codes:
-            if pd.isna(country):
-                continue
-            print(" [Database Sync] | Fetching:", country,end="\n")
-            hotspots = await fetch_country_hotspots(client,country)
-            all_results.extend(hotspots)
-            
+def get_peak_rss_mb():
     try:
+        import resource
+        # kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return 0.0
 
-        with sqlite3.connect('server/data/database/locations.db', timeout=60) as sqlConn:
-                cursor = sqlConn.cursor()
+'''
+Normalizes names of rows inserted by this sync (norm_name is NULL) in batches.
 
-        sqlConn.execute("PRAGMA journal_mode=WAL")
-        sqlConn.execute("BEGIN IMMEDIATE")
-  
-        #create a updates staging table
-        cursor.execute("DROP TABLE IF EXISTS new_hotspots")
+Returns: number of rows normalized
+'''
+def fill_norm_names(cursor, batch_size=5000):
+    rows = cursor.execute("SELECT hotspot_key, name FROM new_hotspots WHERE norm_name IS NULL").fetchall()
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany("UPDATE new_hotspots SET norm_name = ? WHERE hotspot_key = ?", [(normalize(name), key) for key, name in rows[i:i + batch_size]])
+    return len(rows)
 
+'''
+Claims the sync for this process with a lease row, so two syncs (e.g. one per server worker)
+never stream into the same staging table. A lease older than SYNC_LEASE_SECONDS is from a
+sync that died and is taken over.
 
-        cursor.execute("CREATE TABLE new_hotspots (id TEXT PRIMARY KEY, name TEXT, country_code TEXT, subnational1_code TEXT,  subnational2_code TEXT, species_count INTEGER, norm_name TEXT) ")
+Returns: True if this process may sync
+'''
+def acquire_sync_lease(cursor, owner):
+    cursor.execute("CREATE TABLE IF NOT EXISTS sync_lease (id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT, started_at REAL)")
+    cursor.execute("BEGIN IMMEDIATE")
+    row = cursor.execute("SELECT owner, started_at FROM sync_lease").fetchone()
+    if row and time.time() - row[1] < SYNC_LEASE_SECONDS:
+        cursor.execute("ROLLBACK")
+        print(f" [Database Sync] | Sync already running ({row[0]}), skipping")
+        return False
+    cursor.execute("INSERT OR REPLACE INTO sync_lease (id, owner, started_at) VALUES (1, ?, ?)", (owner, time.time()))
+    cursor.execute("COMMIT")
+    return True
+
+def release_sync_lease(cursor, owner):
+    cursor.execute("DELETE FROM sync_lease WHERE owner = ?", (owner,))
 
-        cursor.execute("INSERT INTO new_hotspots (id, name, country_code ,subnational1_code, subnational2_code , species_count, norm_name) SELECT * FROM hotspots ")
+'''
+Creates the new_hotspots staging table and carries the current hotspots over into it, keeping
+their hotspot_key (databases from before it get new keys, from before lat/lng no coordinates
+until a sync fills them).
+'''
+def create_staging_table(cursor):
+    cursor.execute("DROP TABLE IF EXISTS new_hotspots")
+    cursor.execute(STAGING_TABLE_DDL)
 
-        #make updates in staging table        
-        sql_q = '''INSERT INTO 'new_hotspots' (id, name, country_code, subnational1_code, subnational2_code, species_count, norm_name) VALUES (?, ?, ?, ?, ?, ?, ?) 
+    old_columns = {row[1] for row in cursor.execute("PRAGMA table_info('hotspots')")}
+    key = "hotspot_key" if 'hotspot_key' in old_columns else "NULL"
+    coords = "lat, lng" if {'lat', 'lng'} <= old_columns else "NULL, NULL"
 
-        ON CONFLICT(id) DO UPDATE SET species_count = excluded.species_count 
-        WHERE new_hotspots.species_count != excluded.species_count 
-        '''
+    cursor.execute(f"INSERT INTO new_hotspots (hotspot_key, id, name, country_code ,subnational1_code, subnational2_code , species_count, norm_name, lat, lng) SELECT {key}, id, name, country_code, subnational1_code, subnational2_code, species_count, norm_name, {coords} FROM hotspots ")
 
-        for hotspot in all_results:
-             cursor.execute(sql_q, (hotspot['id'],hotspot['name'],hotspot['country'],hotspot['subregion1'],hotspot['subregion2'],hotspot['speciesCount'], normalize(hotspot['name'])))
+'''
+Replaces hotspots with the staging table and rebuilds everything keyed on it (call inside a write transaction).
+'''
+def swap_staging_table(cursor):
+    cursor.execute("ALTER TABLE 'hotspots' RENAME TO old_hotspots")
+    cursor.execute("ALTER TABLE 'new_hotspots' RENAME TO hotspots ")
+    cursor.execute("DROP TABLE 'old_hotspots' ")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotspots_species_count ON hotspots(species_count DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotspots_norm_name ON hotspots(norm_name)")
+
+    #reindex names for search and coordinates for nearby lookups (recreated, older databases keyed them on rowid)
+    cursor.execute("DROP TABLE IF EXISTS hotspots_fts")
+    cursor.execute(SEARCH_INDEX_DDL)
+    cursor.execute(REBUILD_SEARCH_INDEX_SQL)
+    rebuild_geo_index(cursor)
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-        #validate update
-        df = pd.read_sql_query('''SELECT * FROM 'hotspots' ''', sqlConn)
+'''
+Brings locations.db up to SCHEMA_VERSION (stable hotspot_key, search and geo indexes) without
+fetching anything, for deployments that shouldn't wait for the next sync. The app itself never
+builds these, it only opens locations.db read-only.
 
-        print(f"[Database Sync] |  Old Hotspot overview data. Length: {len(df)}, Head: \n {df.head}")
+Returns: True if the database was migrated, False if it already was up to date
+'''
+def migrate_locations_db(db_file=DB_FILE):
+    sqlConn = sqlite3.connect(db_file, timeout=60, isolation_level=None)
+    try:
+        cursor = sqlConn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            cursor.execute("ROLLBACK")
+            print(f"[Database] | {db_file} is up to date (schema version {version})")
+            return False
+
+        print(f"[Database] | migrating {db_file} from schema version {version} to {SCHEMA_VERSION}...")
+        start = time.perf_counter()
+        create_staging_table(cursor)
+        swap_staging_table(cursor)
+        cursor.execute("COMMIT")
+        print(f"[Database] | migrated in {time.perf_counter() - start:.1f}s")
+        return True
+    except sqlite3.Error:
+        if sqlConn.in_transaction:
+            sqlConn.rollback()
+        raise
+    finally:
+        sqlConn.close()
 
-        df2 = pd.read_sql_query('''SELECT * FROM 'new_hotspots' ''', sqlConn)
+'''
+Uses ebird api calls to fetch most recent hotspot info for all locations by country
+
+Each country is upserted into a staging table as it arrives, each batch in its own short write
+transaction, so other writers are never locked out for the length of the crawl. The write lock
+is only held throughout for validating, swapping the staging table in and rebuilding the
+search and geo indexes. WAL readers keep seeing the old table until that commits.
 
-        print(f"[Database Sync] | New Hotspot overview data. Length: {len(df2)}, Head: \n {df2.head}")
+Returns: {"status": ...} on success, None if the database update failed
+'''
+async def sync_data():
+ 
+    print("[Background Data Sync] | Database sync started...")
+    sync_start = time.perf_counter()
 
+    df = pd.read_csv('server/data/countries-Table 1.csv')
+    country_codes = df['country_code'].to_list()
+
+    country_codes = [c for c in country_codes if not pd.isna(c)]
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    sqlConn = None
+    leased = False
+    try:
+
+        # transactions are managed explicitly below
+        sqlConn = sqlite3.connect(DB_FILE, timeout=60, isolation_level=None)
+        cursor = sqlConn.cursor()
+
+        sqlConn.execute("PRAGMA journal_mode=WAL")
+        sqlConn.execute(f"PRAGMA cache_size = -{SYNC_CACHE_SIZE_KB}")
+
+        leased = acquire_sync_lease(cursor, owner)
+        if not leased:
+            return None
+
+        #create a updates staging table
+        cursor.execute("BEGIN IMMEDIATE")
+        create_staging_table(cursor)
+        cursor.execute("COMMIT")
+
+        write_time = 0.0
+
+        def write_batch(hotspots):
+            nonlocal write_time
+            batch_start = time.perf_counter()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(UPSERT_SQL, ((h['id'], h['name'], h['country'], h['subregion1'], h['subregion2'], h['speciesCount'], h['lat'], h['lng']) for h in hotspots))
+            cursor.execute("COMMIT")
+            write_time += time.perf_counter() - batch_start
+
+        fetched, failed = await fetch_all_countries(country_codes, write_batch)
+        if failed:
+            # their carried over rows stay as they were
+            print(f" [Database Sync] | Keeping previous data for {len(failed)} countries that failed: {', '.join(failed)}")
+
+        norm_start = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        normalized = fill_norm_names(cursor)
+        cursor.execute("COMMIT")
+        write_time += time.perf_counter() - norm_start
+
+        #validate, swap and reindex in one transaction
+        cursor.execute("BEGIN IMMEDIATE")
         old_count = cursor.execute("SELECT COUNT(*) FROM 'hotspots' ").fetchone()[0]
 
         new_count = cursor.execute("SELECT COUNT(*) FROM 'new_hotspots' ").fetchone()[0]
 
+        print(f"[Database Sync] | Old hotspot count: {old_count}, new hotspot count: {new_count} ({normalized} new names normalized)")
+
         if new_count < old_count:
              raise ValueError(f" [ERROR] Table size decreased : Old Size = {old_count} New Size = {new_count}")
         
         #if all is good then swap 
-        cursor.execute("ALTER TABLE 'hotspots' RENAME TO old_hotspots")
-        cursor.execute("ALTER TABLE 'new_hotspots' RENAME TO hotspots ")
-        cursor.execute("DROP TABLE 'old_hotspots' ")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotspots_species_count ON hotspots(species_count DESC)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_hotspots_norm_name ON hotspots(norm_name)")
+        swap_staging_table(cursor)
         
 
         print("[Database Sync] | Database was successfuly updated! Sync Complete.")
 
         #only commit if everything succedes
-        sqlConn.commit()
-        return {"status" : f"Saved {len(all_results)} hotspots."}
+        cursor.execute("COMMIT")
+        #cached search candidates are from the old table
+        clear_search_cache()
+
+        elapsed = time.perf_counter() - sync_start
+        print(f"[Database Sync] | {fetched} rows in {elapsed:.1f}s ({fetched / elapsed:.0f} rows/s overall, "
+              f"{fetched / write_time if write_time else 0:.0f} rows/s written), peak RSS {get_peak_rss_mb():.0f} MB")
+        return {"status" : f"Saved {fetched} hotspots."}
          
 
     except sqlite3.Error as e:
         print(f" [Database Sync] | Database UPDATE failed: {e}")
-        sqlConn.rollback() # return database to state before update
         return(None)
 
     finally:
         if sqlConn:
+            if sqlConn.in_transaction:
+                sqlConn.rollback() # return database to state before update
+            if leased:
+                try:
+                    # a failed sync's staging table is dead weight until the next one
+                    cursor.execute("DROP TABLE IF EXISTS new_hotspots")
+                    release_sync_lease(cursor, owner)
+                except sqlite3.Error as e:
+                    print(f" [Database Sync] | Failed to release sync lease: {e}")
             sqlConn.close()
             print(" [Database Sync] | SQLite connection closed")
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sync locations.db with eBird, or only migrate it to the current schema")
+    parser.add_argument("--migrate", action="store_true", help="add the stable hotspot keys and build the search/geo indexes, no eBird requests")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate_locations_db()
+    else:
+        asyncio.run(sync_data())
@@ -0,0 +1,42 @@
+import os
+import httpx
+
+'''
+shared client for the eBird web API (api.ebird.org).
+
+one keep-alive connection pool for all API calls instead of a new connection per request.
+'''
+
+API_BASE = "https://api.ebird.org/v2"
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+_api_client: httpx.AsyncClient = None
+
+def get_api_client() -> httpx.AsyncClient:
+    global _api_client
+    if _api_client is None:
+        # read the key here, not at import: .env is only loaded after this module is imported
+        api_key = os.getenv("EBIRD_API_KEY")
+        if not api_key:
+            raise RuntimeError("EBIRD_API_KEY is not set, the eBird API can't be used.")
+        _api_client = httpx.AsyncClient(
+            base_url=API_BASE,
+            http2=HTTP2,
+            headers={"X-eBirdApiToken": api_key},
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=20
+        )
+        print(f"[eBird API] | client ready (http2={HTTP2})")
+    return _api_client
+
+async def close_api_client():
+    global _api_client
+    if _api_client is not None:
+        await _api_client.aclose()
+        _api_client = None
+        print("[eBird API] | client closed")
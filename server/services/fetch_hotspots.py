@@ -1,4 +1,7 @@
-from services.ranking_engine.data_processing import  get_rankings
+from services.ranking_engine.data_processing import  get_rankings, resolve_years, fetch_barchart, FETCH_MODE
+from services.barchart_store import load_barchart, save_barchart
+from services.locations_db import query, query_one, HOTSPOT_BY_ID_SQL, OVERVIEWS_SQL
+from services.bird_metadata import enrich_page
 import pandas as pd
 import os
 import asyncio
@@ -16,20 +19,96 @@ HEADERS = {"X-eBirdApiToken":os.getenv("EBIRD_API_KEY")}
 
 
 # cache hotspot rankings for 24 hours to speed up pdf gen
+# birds are stored unenriched, codes/urls/images are filled in per served page (get_report_page)
 HOTSPOT_CACHE = TTLCache(maxsize=500, ttl=86400)
 
-## cache raw TSV data separately (keyed by hotspot+years only)
-## this lets us instant re-filtering when only time params change
-RAW_DATA_CACHE = TTLCache(maxsize=500, ttl=86400)
+## cache parsed barcharts separately (keyed by hotspot+years only)
+## holds species names + float32 freq matrix + sample sizes instead of the raw TSV,
+## so re-filtering when only time params change skips text parsing entirely
+PARSED_DATA_CACHE = TTLCache(maxsize=500, ttl=86400)
 
-def get_cache_key(hotspotID, start_yr, end_yr, start_month, start_week, end_month, end_week):
+## in-flight barchart loads keyed by raw cache key (single-flight)
+## concurrent requests for the same hotspot+years share one store lookup / eBird fetch,
+## even when their time filters differ
+INFLIGHT_BARCHARTS = {}
+
+def get_cache_key(hotspotID, start_yr, end_yr, start_month, start_week, end_month, end_week, top_k=None):
     """generate a unique cache key based on all filter parameters"""
-    return f"{hotspotID}:{start_yr}:{end_yr}:{start_month}:{start_week}:{end_month}:{end_week}"
+    return f"{hotspotID}:{start_yr}:{end_yr}:{start_month}:{start_week}:{end_month}:{end_week}:{top_k}"
 
 def get_raw_cache_key(hotspotID, start_yr, end_yr):
-    """generate cache key for raw TSV data (year range only, no time filters)"""
+    """generate cache key for barchart data (year range only, no time filters)"""
     return f"raw:{hotspotID}:{start_yr}:{end_yr}"
 
+def has_parsed_barchart(hotspotID, start_yr, end_yr):
+    """true if a report for these years can be re-filtered from memory without fetching"""
+    start_yr, end_yr = resolve_years(start_yr, end_yr)
+    return get_raw_cache_key(hotspotID, start_yr, end_yr) in PARSED_DATA_CACHE
+
+async def load_or_fetch_barchart(hotspotID, start_yr, end_yr, raw_cache_key):
+    """load a barchart from the persistent store, or fetch it from eBird and store it"""
+    # yearly mode stores single years only, fetch_barchart composes the range from them
+    store_range = FETCH_MODE != 'yearly'
+
+    # persistent store first, so restarts don't pay for the eBird fetch again
+    barchart = await asyncio.to_thread(load_barchart, hotspotID, start_yr, end_yr) if store_range else None
+
+    if barchart is not None:
+        print(f"[cache] | DISK HIT for {hotspotID} - loaded barchart from store")
+    else:
+        print(f"[cache] | MISS for {hotspotID} - fetching from eBird")
+        # fetch_data raises once its retries run out (network/http errors, eBird blocking us)
+        fetch_error = None
+        try:
+            barchart = await fetch_barchart(hotspotID, start_yr, end_yr)
+        except Exception as e:
+            barchart = None
+            fetch_error = e
+
+        if barchart is not None:
+            if store_range:
+                await asyncio.to_thread(save_barchart, hotspotID, start_yr, end_yr, barchart)
+        else:
+            # eBird unavailable, an outdated barchart beats failing the report
+            if store_range:
+                barchart = await asyncio.to_thread(load_barchart, hotspotID, start_yr, end_yr, allow_stale=True)
+            if barchart is None:
+                if fetch_error is not None:
+                    raise fetch_error
+                raise Exception("Failed to fetch data (None returned)")
+            print(f"[cache] | fetch failed for {hotspotID} ({fetch_error or 'no data'}) - serving stale barchart from store")
+
+    # cache the parsed barchart for future time filter changes
+    PARSED_DATA_CACHE[raw_cache_key] = barchart
+    print(f"[cache] | stored parsed barchart for {hotspotID}: {barchart.memory_summary()} (enables instant time filtering)")
+    return barchart
+
+async def get_shared_barchart(hotspotID, start_yr, end_yr, raw_cache_key):
+    """attach to an in-flight load for the same hotspot+years, or start one"""
+    task = INFLIGHT_BARCHARTS.get(raw_cache_key)
+
+    if task is None:
+        task = asyncio.ensure_future(load_or_fetch_barchart(hotspotID, start_yr, end_yr, raw_cache_key))
+        INFLIGHT_BARCHARTS[raw_cache_key] = task
+        task.add_done_callback(lambda _: INFLIGHT_BARCHARTS.pop(raw_cache_key, None))
+    else:
+        print(f"[cache] | JOINED in-flight fetch for {hotspotID}")
+
+    # shield so one caller timing out doesn't cancel the fetch for everyone else
+    return await asyncio.shield(task)
+
+async def get_report_page(ranked, offset=0, limit=None):
+    """
+    a cached report with only birds[offset:offset + limit] enriched and returned (limit None = to the end).
+    total_birds counts the whole ranking so clients can page through it.
+    """
+    page = {key: value for key, value in ranked.items() if key != 'birds'}
+    page['birds'] = await enrich_page(ranked['birds'], offset, limit)
+    page['offset'] = offset
+    page['limit'] = limit
+    page['total_birds'] = len(ranked['birds'])
+    return page
+
 async def detailed_hotspot_data(
     hotspotID: str,
     start_yr: int | None = None,
@@ -37,24 +116,30 @@ async def detailed_hotspot_data(
     start_month: int | None = None,
     start_week: int | None = None,
     end_month: int | None = None,
-    end_week: int | None = None
+    end_week: int | None = None,
+    top_k: int | None = None,
+    offset: int = 0,
+    limit: int | None = None
 ):
     # check full result cache first
-    cache_key = get_cache_key(hotspotID, start_yr, end_yr, start_month, start_week, end_month, end_week)
+    cache_key = get_cache_key(hotspotID, start_yr, end_yr, start_month, start_week, end_month, end_week, top_k)
     if cache_key in HOTSPOT_CACHE:
         print(f"[cache] | FULL HIT for {hotspotID} - using cached result")
-        return HOTSPOT_CACHE[cache_key]
+        return await get_report_page(HOTSPOT_CACHE[cache_key], offset, limit)
     
-    # check if we have cached raw data for this hotspot+years
+    # resolve default years so barchart keys match however the range was requested
+    start_yr, end_yr = resolve_years(start_yr, end_yr)
+
+    # check if we have a cached parsed barchart for this hotspot+years
     raw_cache_key = get_raw_cache_key(hotspotID, start_yr, end_yr)
-    cached_raw = RAW_DATA_CACHE.get(raw_cache_key)
+    cached_barchart = PARSED_DATA_CACHE.get(raw_cache_key)
     
-    if cached_raw:
+    if cached_barchart is not None:
         print(f"[cache] | RAW HIT for {hotspotID} - re-filtering cached data (instant!)")
     else:
-        print(f"[cache] | MISS for {hotspotID} - fetching from eBird")
+        cached_barchart = await get_shared_barchart(hotspotID, start_yr, end_yr, raw_cache_key)
     
-    # call get_rankings with cached raw data if available
+    # call get_rankings with the parsed data
     ret = await get_rankings(
         hotspotID,
         start_yr,
@@ -63,31 +148,23 @@ async def detailed_hotspot_data(
         start_week=start_week,
         end_month=end_month,
         end_week=end_week,
-        cached_raw_data=cached_raw  # pass cached raw data if we have it
+        cached_barchart=cached_barchart,
+        top_k=top_k,
+        enrich=False
     )
 
     if ret:
+        ret.pop('barchart', None)
         birds = ret['data']
         total_sample_size = ret['total_sample_size']
         sample_sizes_by_week = ret['sample_sizes_by_week']
-        
-        # cache the raw TSV data for future time filter changes
-        if 'raw_tsv' in ret and not cached_raw:
-            RAW_DATA_CACHE[raw_cache_key] = ret['raw_tsv']
-            print(f"[cache] | stored raw TSV for {hotspotID} (enables instant time filtering)")
+        total_species = ret['total_species']
 
     else:
         return None
 
     try:
-        with sqlite3.connect('server/data/database/locations.db') as sqlConn:
-                cursor = sqlConn.cursor()
-    
-        sql_q = "SELECT h.id, h.name, c.country_name, s1.subnational1_name, s2.subnational2_name, h.species_count, h.norm_name FROM 'hotspots' AS h LEFT JOIN 'countries' AS c ON h.country_code = c.country_code LEFT JOIN 'subregions1' AS s1 ON h.subnational1_code = s1.subnational1_code LEFT JOIN 'subregions2' AS s2 ON h.subnational2_code = s2.subnational2_code  WHERE h.id = ?"
-
-        cursor.execute(sql_q, (hotspotID,))
-
-        hotspot_data = cursor.fetchone()
+        hotspot_data = query_one(HOTSPOT_BY_ID_SQL, (hotspotID,))
 
         ranked = None
 
@@ -99,6 +176,7 @@ async def detailed_hotspot_data(
         "subregion2": hotspot_data[4],
         "total_sample_size": total_sample_size,
         "sample_sizes_by_week": sample_sizes_by_week,
+        "total_species": total_species,
         "birds":birds
         }
         
@@ -106,27 +184,15 @@ async def detailed_hotspot_data(
         HOTSPOT_CACHE[cache_key] = ranked
         print(f"[cache] | stored result for {hotspotID} in cache (expires in 24 hours)")
 
-        return ranked
+        return await get_report_page(ranked, offset, limit)
 
     except sqlite3.Error as e:
         print(f" [Database Request] | Database retrieval for detailed hotspot overview failed: {e}")
         return(None)
 
-    finally:
-        if sqlConn:
-            sqlConn.close()
-            print(" [Database Request] | SQLite connection closed")
-
 def get_overviews(limit:int = 20, offset:int = 0):
     try:
-        with sqlite3.connect('server/data/database/locations.db') as sqlConn:
-                cursor = sqlConn.cursor()
-
-        sql_q = "SELECT h.id, h.name, c.country_name, s1.subnational1_name, s2.subnational2_name, h.species_count, h.norm_name FROM 'hotspots' AS h LEFT JOIN 'countries' AS c ON h.country_code = c.country_code LEFT JOIN 'subregions1' AS s1 ON h.subnational1_code = s1.subnational1_code LEFT JOIN 'subregions2' AS s2 ON h.subnational2_code = s2.subnational2_code ORDER BY h.species_count DESC LIMIT ? OFFSET ?"
-
-        cursor.execute(sql_q, (limit, offset))
-
-        hotspot_data = cursor.fetchall()
+        hotspot_data = query(OVERVIEWS_SQL, (limit, offset))
 
         overviews = []
 
@@ -146,8 +212,3 @@ def get_overviews(limit:int = 20, offset:int = 0):
     except sqlite3.Error as e:
         print(f" [Database Request] | Database overviews retrieval failed: {e}")
         return(None)
-
-    finally:
-        if sqlConn:
-            sqlConn.close()
-            print(" [Database Request] | SQLite connection closed")
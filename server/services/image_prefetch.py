@@ -0,0 +1,239 @@
+import os
+import re
+import time
+import asyncio
+import argparse
+import httpx
+from playwright.async_api import async_playwright
+from services import metadata_store
+from services.ebird_api import HTTP2
+from services.rate_limit import TokenBucket, RETRY_STATUS, get_retry_delay
+from services.metadata_store import METADATA_CACHE_FILE
+from services.bird_metadata import load_taxonomy, build_species_url, block_media, scrape_species_image, export_metadata_json
+
+'''
+concurrent species image prefetch (refreshes the metadata store and the committed json seed).
+
+each species page is first fetched over plain http and its og:image read from the <head>,
+the playwright page pool is only used when that doesn't give a Macaulay Library photo.
+every request start goes through one rate limiter shared by both paths.
+
+the species still to visit are kept in the store's prefetch_queue and removed one by one as
+they finish, so an interrupted run resumes where it stopped. only species without an image or
+with one older than BIRD_IMAGE_TTL_DAYS are queued.
+
+from the repo root:
+    PYTHONPATH=server python server/services/image_prefetch.py
+    PYTHONPATH=server python server/services/image_prefetch.py --limit 200 --restart
+'''
+
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '8'))
+PREFETCH_PAGES = int(os.getenv('PREFETCH_PAGES', '4'))
+PREFETCH_RATE_LIMIT = float(os.getenv('PREFETCH_RATE_LIMIT', '4'))
+IMAGE_TTL = float(os.getenv('BIRD_IMAGE_TTL_DAYS', '180')) * 86400
+
+PREFETCH_MAX_RETRIES = 3
+# give up on plain http for the run after this many pages in a row without a usable og:image
+HTTP_MISS_LIMIT = 25
+# the <head> is all we need, stop reading after it (or this many characters)
+MAX_HEAD_CHARS = 256 * 1024
+REPORT_EVERY = 50
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+OG_IMAGE_RE = re.compile(r'<meta[^>]+property=["\']og:image["\'][^>]*>', re.IGNORECASE)
+CONTENT_RE = re.compile(r'content=["\']([^"\']+)["\']', re.IGNORECASE)
+# stored urls use the 320px rendition, same as img.Species-media-image
+ASSET_RE = re.compile(r'(https://cdn\.download\.ams\.birds\.cornell\.edu/api/v1/asset/\d+)')
+
+def parse_og_image(html):
+    """Macaulay Library asset url from the page's og:image, None for generic/missing images"""
+    tag = OG_IMAGE_RE.search(html)
+    if not tag:
+        return None
+    content = CONTENT_RE.search(tag.group(0))
+    asset = ASSET_RE.match(content.group(1)) if content else None
+    return f"{asset.group(1)}/320" if asset else None
+
+class PagePool:
+    """playwright pages shared by the prefetch workers, chromium is only launched on first use"""
+    def __init__(self, size):
+        self.size = size
+        self.pages = asyncio.Queue()
+        self.created = 0
+        self.lock = asyncio.Lock()
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.unavailable = False
+
+    async def acquire(self):
+        async with self.lock:
+            # PREFETCH_PAGES=0 means http only
+            if self.unavailable or self.size <= 0:
+                return None
+            if self.pages.empty() and self.created < self.size:
+                try:
+                    if self.context is None:
+                        print(f"[prefetch] | launching browser ({self.size} pages)...")
+                        self.playwright = await async_playwright().start()
+                        self.browser = await self.playwright.chromium.launch(headless=True)
+                        self.context = await self.browser.new_context(user_agent=USER_AGENT)
+                        await self.context.route("**/*", block_media)
+                    page = await self.context.new_page()
+                except Exception as e:
+                    print(f"[prefetch] | browser unavailable, continuing with http only: {e}")
+                    self.unavailable = True
+                    return None
+                self.created += 1
+                return page
+        return await self.pages.get()
+
+    def release(self, page):
+        self.pages.put_nowait(page)
+
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+class PrefetchStats:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.sources = {"http": 0, "browser": 0, "failed": 0}
+        self.start = time.perf_counter()
+
+    def record(self, source):
+        self.done += 1
+        self.sources[source] += 1
+        if self.done % REPORT_EVERY == 0 or self.done == self.total:
+            self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed else 0
+        eta = (self.total - self.done) / rate if rate else 0
+        print(f"[prefetch] | {self.done}/{self.total} species in {elapsed:.0f}s ({rate:.2f}/s, eta {eta / 60:.1f} min) "
+              f"http {self.sources['http']}, browser {self.sources['browser']}, failed {self.sources['failed']}")
+
+async def fetch_og_image(client, limiter, bird_code):
+    """
+    image url from the species page <head> over plain http, retries 429/5xx and connection errors.
+
+    returns: image url, or None if the page has no usable og:image or every attempt failed
+    """
+    for attempt in range(PREFETCH_MAX_RETRIES + 1):
+        await limiter.acquire()
+        retry_delay = None
+        head = ""
+        try:
+            async with client.stream("GET", build_species_url(bird_code)) as res:
+                if res.status_code in RETRY_STATUS and attempt < PREFETCH_MAX_RETRIES:
+                    retry_delay = get_retry_delay(attempt, res)
+                elif res.status_code != 200:
+                    return None
+                else:
+                    async for chunk in res.aiter_text():
+                        head += chunk
+                        if "</head>" in head or len(head) > MAX_HEAD_CHARS:
+                            break
+        except httpx.TransportError as e:
+            if attempt == PREFETCH_MAX_RETRIES:
+                print(f"[prefetch] | {bird_code}: {e}")
+                return None
+            retry_delay = get_retry_delay(attempt)
+
+        if retry_delay is None:
+            return parse_og_image(head)
+        await asyncio.sleep(retry_delay)
+
+    return None
+
+async def run_prefetch(limit=None, restart=False):
+    # refreshes missing/stale species images, resuming an interrupted run unless restart
+    birds = load_taxonomy()
+    if not birds:
+        return
+
+    queued = [] if restart else metadata_store.get_prefetch_queue()
+    if queued:
+        print(f"[prefetch] | resuming interrupted prefetch, {len(queued)} species left")
+    else:
+        fresh = metadata_store.get_fresh_codes(IMAGE_TTL)
+        queued = [(bird['code'], bird['comName']) for bird in birds if bird['code'] not in fresh]
+        if limit:
+            queued = queued[:limit]
+        metadata_store.fill_prefetch_queue(queued)
+        print(f"[prefetch] | {len(queued)} of {len(birds)} species have no image or one older than {IMAGE_TTL / 86400:.0f} days")
+
+    if not queued:
+        return
+
+    print(f"[prefetch] | {PREFETCH_CONCURRENCY} workers, {PREFETCH_PAGES} browser pages, {PREFETCH_RATE_LIMIT:g} req/s max")
+
+    work = asyncio.Queue()
+    for item in queued:
+        work.put_nowait(item)
+
+    stats = PrefetchStats(len(queued))
+    limiter = TokenBucket(PREFETCH_RATE_LIMIT)
+    pages = PagePool(PREFETCH_PAGES)
+    http = {"hits": 0, "misses_in_row": 0, "enabled": True}
+
+    async def fetch_species_image(client, bird_code):
+        if http["enabled"]:
+            image_url = await fetch_og_image(client, limiter, bird_code)
+            if image_url:
+                http["hits"] += 1
+                http["misses_in_row"] = 0
+                return image_url, "http"
+
+            http["misses_in_row"] += 1
+            if http["hits"] == 0 and http["misses_in_row"] >= HTTP_MISS_LIMIT:
+                http["enabled"] = False
+                print(f"[prefetch] | no og:image in the first {HTTP_MISS_LIMIT} pages, using the browser only")
+
+        page = await pages.acquire()
+        if page is None:
+            return None, "failed"
+        try:
+            await limiter.acquire()
+            image_url = await scrape_species_image(bird_code, page)
+        except Exception as e:
+            print(f"[prefetch] | image fetch error {bird_code}: {e}")
+            image_url = None
+        finally:
+            pages.release(page)
+
+        return image_url, "browser" if image_url else "failed"
+
+    async def worker(client):
+        while True:
+            try:
+                bird_code, com_name = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            image_url, source = await fetch_species_image(client, bird_code)
+            # result + dequeue in one transaction, this is the checkpoint
+            metadata_store.complete_prefetch(bird_code, com_name, image_url)
+            stats.record(source)
+
+    limits = httpx.Limits(max_connections=PREFETCH_CONCURRENCY, max_keepalive_connections=PREFETCH_CONCURRENCY)
+    async with httpx.AsyncClient(http2=HTTP2, headers={"User-Agent": USER_AGENT}, limits=limits, timeout=20, follow_redirects=True) as client:
+        try:
+            await asyncio.gather(*(worker(client) for _ in range(PREFETCH_CONCURRENCY)))
+        finally:
+            await pages.close()
+
+    saved = export_metadata_json()
+    print(f"[success] | completed pre-fetch. {saved} species exported to {METADATA_CACHE_FILE}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="refresh missing or stale species images")
+    parser.add_argument("--limit", type=int, help="only queue the first N species that need an image")
+    parser.add_argument("--restart", action="store_true", help="ignore an interrupted run's queue and rebuild it")
+    args = parser.parse_args()
+    asyncio.run(run_prefetch(limit=args.limit, restart=args.restart))
@@ -1,17 +1,26 @@
 import asyncio
+import os
 import uuid
 from enum import Enum
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from services.browser_manager import get_browser
 
 '''
-manages a single-worker queue to serialize playwright usage.
+manages background job queues, split into lanes so slow work can't starve cheap work.
+
+lanes (each has its own queue and worker pool, sized with JOB_WORKERS_<LANE>):
+    interactive: report re-filters whose barchart is already parsed in memory
+    network:     jobs that may have to fetch barcharts from eBird
+    pdf:         chromium pdf exports
+    image:       species image lookups
 
 job lifecycle:
     1. route enqueues job -> receives job_id
-    2. worker processes job (one at a time)
-    3. client polls /jobs/{job_id} for completion
+       (identical requests with the same dedup_key attach to the job already queued/processing)
+    2. a worker of the job's lane processes it
+    3. client listens on /jobs/{job_id}/events (SSE) for status/queue position changes,
+       or polls /jobs/{job_id} for completion
 '''
 # job types
 class JobType(str, Enum):
@@ -27,36 +36,181 @@ class JobStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+# lane a job type runs in unless the route picks one (e.g. interactive for cache hits)
+DEFAULT_LANES = {
+    JobType.FETCH_BARCHARTS: "network",
+    JobType.FETCH_HOTSPOT_REPORT: "network",
+    JobType.GENERATE_PDF: "pdf",
+    JobType.FETCH_IMAGE: "image",
+}
+
+# workers per lane, network keeps honoring the old JOB_WORKER_COUNT setting
+LANE_WORKERS = {
+    "interactive": int(os.getenv('JOB_WORKERS_INTERACTIVE', '2')),
+    "network": int(os.getenv('JOB_WORKERS_NETWORK', os.getenv('JOB_WORKER_COUNT', '2'))),
+    "pdf": int(os.getenv('JOB_WORKERS_PDF', '1')),
+    "image": int(os.getenv('JOB_WORKERS_IMAGE', '2')),
+}
+
 class JobManager:
-    # initialize queue
+    # initialize one queue per lane
     def __init__(self):
-        self.queue = asyncio.Queue()
+        self.queues: Dict[str, asyncio.Queue] = {lane: asyncio.Queue() for lane in LANE_WORKERS}
         self.jobs: Dict[str, Dict[str, Any]] = {}
+        # dedup_key -> job_id for jobs still queued or processing
+        self.inflight: Dict[str, str] = {}
+        # queued job ids in order per lane, for queue position updates
+        self.pending: Dict[str, List[str]] = {lane: [] for lane in LANE_WORKERS}
+        # job ids currently running per lane
+        self.active: Dict[str, int] = {lane: 0 for lane in LANE_WORKERS}
+        # job type -> lane -> queue wait / run time totals
+        self.metrics: Dict[str, Dict[str, Dict[str, float]]] = {}
+        # job_id -> event queues of connected SSE clients
+        self.listeners: Dict[str, List[asyncio.Queue]] = {}
         self.worker_tasks = []
         self.running = False
 
     # enqueue job and return id
-    async def enqueue_job(self, job_type: JobType, **payload) -> str:
+    # jobs with the same dedup_key share one in-flight job (single-flight)
+    # lane overrides the job type's default lane
+    async def enqueue_job(self, job_type: JobType, dedup_key: Optional[str] = None, lane: Optional[str] = None, **payload) -> str:
+        if dedup_key:
+            existing_id = self.inflight.get(dedup_key)
+            existing = self.jobs.get(existing_id) if existing_id else None
+            if existing and existing["status"] in (JobStatus.QUEUED, JobStatus.PROCESSING):
+                print(f"[JobQueue] Coalesced request into in-flight job {existing_id} ({job_type})")
+                return existing_id
+
+        lane = lane if lane in self.queues else DEFAULT_LANES[job_type]
         job_id = str(uuid.uuid4())
         job = {
             "id": job_id,
             "type": job_type,
+            "lane": lane,
             "status": JobStatus.QUEUED,
             "payload": payload,
             "result": None,
             "error": None,
+            "dedup_key": dedup_key,
             "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
+            "started_at": None,
+            "updated_at": datetime.now().isoformat(),
+            "wait_ms": None,
+            "run_ms": None
         }
         self.jobs[job_id] = job
-        await self.queue.put(job_id)
-        print(f"[JobQueue] Enqueued job {job_id} ({job_type})")
+        if dedup_key:
+            self.inflight[dedup_key] = job_id
+        self.pending[lane].append(job_id)
+        await self.queues[lane].put(job_id)
+        print(f"[JobQueue] Enqueued job {job_id} ({job_type}, {lane} lane)")
         return job_id
 
     # get job by id
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         return self.jobs.get(job_id)
 
+    # true while a job with this dedup_key is queued or processing
+    def is_inflight(self, dedup_key: str) -> bool:
+        return dedup_key in self.inflight
+
+    # release the dedup slot once a job is done so later requests start fresh
+    def _release(self, job: Dict[str, Any]):
+        dedup_key = job.get("dedup_key")
+        if dedup_key and self.inflight.get(dedup_key) == job["id"]:
+            del self.inflight[dedup_key]
+
+    # subscribe to state transitions of a job (used by the SSE endpoint)
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        listener = asyncio.Queue()
+        self.listeners.setdefault(job_id, []).append(listener)
+        return listener
+
+    def unsubscribe(self, job_id: str, listener: asyncio.Queue):
+        listeners = self.listeners.get(job_id, [])
+        if listener in listeners:
+            listeners.remove(listener)
+        if not listeners:
+            self.listeners.pop(job_id, None)
+
+    # compact view of a job for events, the result is only sent once the job completes
+    def get_event(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        event = {"id": job["id"], "status": job["status"]}
+        pending = self.pending[job["lane"]]
+        if job["status"] == JobStatus.QUEUED and job["id"] in pending:
+            event["position"] = pending.index(job["id"]) + 1
+        elif job["status"] == JobStatus.COMPLETED:
+            event["result"] = job["result"]
+        elif job["status"] == JobStatus.FAILED:
+            event["error"] = job["error"]
+        return event
+
+    def _publish(self, job: Dict[str, Any]):
+        for listener in self.listeners.get(job["id"], []):
+            listener.put_nowait(self.get_event(job))
+
+    # queue positions shift whenever a job leaves its lane's queue
+    def _publish_positions(self, lane: str):
+        for job_id in self.pending[lane]:
+            if job_id in self.listeners:
+                self._publish(self.jobs[job_id])
+
+    # move a job to a new status and notify listeners
+    def _set_status(self, job: Dict[str, Any], status: JobStatus):
+        now = datetime.now()
+        job["status"] = status
+        job["updated_at"] = now.isoformat()
+        if status == JobStatus.PROCESSING:
+            job["started_at"] = now.isoformat()
+            job["wait_ms"] = (now - datetime.fromisoformat(job["created_at"])).total_seconds() * 1000
+        elif status in (JobStatus.COMPLETED, JobStatus.FAILED):
+            if job["started_at"]:
+                job["run_ms"] = (now - datetime.fromisoformat(job["started_at"])).total_seconds() * 1000
+                self._record(job)
+            self._release(job)
+        self._publish(job)
+
+    # add a finished job's queue wait and run time to the per type/lane totals
+    def _record(self, job: Dict[str, Any]):
+        lanes = self.metrics.setdefault(job["type"].value, {})
+        stats = lanes.setdefault(job["lane"], {
+            "count": 0, "failed": 0,
+            "wait_total_ms": 0.0, "wait_max_ms": 0.0,
+            "run_total_ms": 0.0, "run_max_ms": 0.0
+        })
+        stats["count"] += 1
+        if job["status"] == JobStatus.FAILED:
+            stats["failed"] += 1
+        stats["wait_total_ms"] += job["wait_ms"]
+        stats["wait_max_ms"] = max(stats["wait_max_ms"], job["wait_ms"])
+        stats["run_total_ms"] += job["run_ms"]
+        stats["run_max_ms"] = max(stats["run_max_ms"], job["run_ms"])
+
+    # lane load plus average/max queue wait vs run time per job type
+    def get_metrics(self) -> Dict[str, Any]:
+        lanes = {
+            lane: {
+                "workers": LANE_WORKERS[lane],
+                "queued": len(self.pending[lane]),
+                "processing": self.active[lane]
+            }
+            for lane in LANE_WORKERS
+        }
+        types = {}
+        for job_type, by_lane in self.metrics.items():
+            types[job_type] = {}
+            for lane, stats in by_lane.items():
+                count = stats["count"]
+                types[job_type][lane] = {
+                    "count": count,
+                    "failed": stats["failed"],
+                    "wait_avg_ms": round(stats["wait_total_ms"] / count, 1),
+                    "wait_max_ms": round(stats["wait_max_ms"], 1),
+                    "run_avg_ms": round(stats["run_total_ms"] / count, 1),
+                    "run_max_ms": round(stats["run_max_ms"], 1)
+                }
+        return {"lanes": lanes, "types": types}
+
     # background cleanup task
     async def _cleanup_loop(self):
         print("[JobQueue] Cleanup task started")
@@ -86,18 +240,17 @@ class JobManager:
             except Exception as e:
                 print(f"[JobQueue] cleanup error: {e}")
 
-    # start background workers
+    # start background workers, one pool per lane
     async def start_worker(self):
         if self.running:
             return
         self.running = True
-        # default 2 workers
-        import os
-        worker_count = int(os.getenv('JOB_WORKER_COUNT', '2'))
-        print(f"[JobQueue] Starting {worker_count} background workers...")
+        print(f"[JobQueue] Starting background workers per lane: {LANE_WORKERS}")
         
         self.worker_tasks = [
-            asyncio.create_task(self._worker_loop(i)) for i in range(worker_count)
+            asyncio.create_task(self._worker_loop(lane, i))
+            for lane, worker_count in LANE_WORKERS.items()
+            for i in range(max(worker_count, 1))
         ]
         # add cleanup task
         self.worker_tasks.append(asyncio.create_task(self._cleanup_loop()))
@@ -117,13 +270,18 @@ class JobManager:
         print("[JobQueue] all workers stopped")
 
     # background loop processing jobs
-    async def _worker_loop(self, worker_id: int):
-        print(f"[JobQueue] worker {worker_id} loop running")
+    async def _worker_loop(self, lane: str, worker_id: int):
+        print(f"[JobQueue] {lane} worker {worker_id} loop running")
+        queue = self.queues[lane]
         while self.running:
             try:
-                job_id = await self.queue.get()
+                job_id = await queue.get()
+                if job_id in self.pending[lane]:
+                    self.pending[lane].remove(job_id)
+                self._publish_positions(lane)
                 
                 # kill any job taking too long
+                self.active[lane] += 1
                 try:
                     await asyncio.wait_for(self._process_job(job_id), timeout=300)
                 except asyncio.TimeoutError:
@@ -131,11 +289,12 @@ class JobManager:
                     # manually mark as failed
                     job = self.jobs.get(job_id)
                     if job:
-                        job["status"] = JobStatus.FAILED
                         job["error"] = "Server Busy: Job timed out (Limit: 300s)"
-                        job["updated_at"] = datetime.now().isoformat()
+                        self._set_status(job, JobStatus.FAILED)
+                finally:
+                    self.active[lane] -= 1
                         
-                self.queue.task_done()
+                queue.task_done()
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -148,13 +307,9 @@ class JobManager:
         if not job:
             return
 
-        job["status"] = JobStatus.PROCESSING
-        job["updated_at"] = datetime.now().isoformat()
+        self._set_status(job, JobStatus.PROCESSING)
         
         try:
-            # get shared browser instance
-            # serialized access via worker loop
-            browser = await get_browser()
             payload = job["payload"]
             
             result = None
@@ -165,7 +320,7 @@ class JobManager:
                 
                 loc = payload["loc"]
                 
-                await ensure_session(browser)
+                await ensure_session()
                 
                 result = await get_rankings(
                     loc,
@@ -175,8 +330,11 @@ class JobManager:
                     start_week=payload.get("start_week"),
                     end_month=payload.get("end_month"),
                     end_week=payload.get("end_week"),
-                    cached_raw_data=payload.get("cached_raw_data")
+                    cached_raw_data=payload.get("cached_raw_data"),
+                    top_k=payload.get("top_k")
                 )
+                # parsed matrices are not json serializable, keep them out of the job result
+                result.pop('barchart', None)
 
             elif job["type"] == JobType.FETCH_HOTSPOT_REPORT:
                 from services.fetch_hotspots import detailed_hotspot_data
@@ -188,7 +346,10 @@ class JobManager:
                     start_month=payload.get("start_month"),
                     start_week=payload.get("start_week"),
                     end_month=payload.get("end_month"),
-                    end_week=payload.get("end_week")
+                    end_week=payload.get("end_week"),
+                    top_k=payload.get("top_k"),
+                    offset=payload.get("offset", 0),
+                    limit=payload.get("limit")
                 )
                 
             elif job["type"] == JobType.GENERATE_PDF:
@@ -214,6 +375,8 @@ class JobManager:
                 from services.bird_metadata import get_species_image_url
                 bird_code = job["payload"]["bird_code"]
                 
+                # only image scraping needs the shared browser up front
+                browser = await get_browser()
                 page = await browser.new_page()
                 try:
                     result = await get_species_image_url(bird_code, browser_page=page)
@@ -221,14 +384,12 @@ class JobManager:
                     await page.close()
 
             job["result"] = result
-            job["status"] = JobStatus.COMPLETED
+            self._set_status(job, JobStatus.COMPLETED)
             print(f"[JobQueue] job {job_id} completed")
             
         except Exception as e:
             print(f"[JobQueue] job {job_id} failed: {e}")
             job["error"] = str(e)
-            job["status"] = JobStatus.FAILED
-        finally:
-            job["updated_at"] = datetime.now().isoformat()
+            self._set_status(job, JobStatus.FAILED)
 
 job_manager = JobManager()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import os
+import asyncio
+import sqlite3
+from cachetools import LRUCache
+from services.ebird_api import get_api_client
+from services.locations_db import query
+
+'''
+resolves hotspot ids to names.
+
+lookup order:
+    1. in-memory LRU of names already resolved
+    2. hotspots table in locations.db (one query for the whole batch)
+    3. eBird API (/ref/hotspot/info), concurrently over the shared client
+
+re-filtering a hotspot that was already ranked makes no network calls.
+'''
+
+UNKNOWN_LOCATION = 'Unknown Location'
+
+LOCATION_NAME_CACHE = LRUCache(maxsize=int(os.getenv('LOCATION_NAME_CACHE_SIZE', '5000')))
+
+def lookup_db_names(loc_ids):
+    """names for the ids found in the local hotspots table"""
+    if not loc_ids:
+        return {}
+    try:
+        placeholders = ",".join("?" * len(loc_ids))
+        rows = query(f"SELECT id, name FROM hotspots WHERE id IN ({placeholders})", list(loc_ids))
+    except sqlite3.Error as e:
+        print(f"[locations] | db lookup failed: {e}")
+        return {}
+    return {loc_id: name for loc_id, name in rows if name}
+
+async def fetch_api_name(loc_id):
+    try:
+        res = await get_api_client().get(f"/ref/hotspot/info/{loc_id}")
+        if res.status_code == 200:
+            return res.json().get('locName')
+    except Exception as e:
+        print(f"[locations] | api lookup failed for {loc_id}: {e}")
+    return None
+
+async def get_location_names(loc_ids):
+    """resolve a batch of hotspot ids, returns {loc_id: name} (UNKNOWN_LOCATION if unresolved)"""
+    names = {}
+    missing = []
+    for loc_id in dict.fromkeys(loc_ids):
+        if loc_id in LOCATION_NAME_CACHE:
+            names[loc_id] = LOCATION_NAME_CACHE[loc_id]
+        else:
+            missing.append(loc_id)
+
+    if missing:
+        found = await asyncio.to_thread(lookup_db_names, missing)
+        remote = [loc_id for loc_id in missing if loc_id not in found]
+        if remote:
+            print(f"[locations] | {len(remote)} not in local db, asking eBird API")
+            api_names = await asyncio.gather(*(fetch_api_name(loc_id) for loc_id in remote))
+            found.update({loc_id: name for loc_id, name in zip(remote, api_names) if name})
+
+        # only remember real names, unresolved ids are retried next time
+        for loc_id, name in found.items():
+            LOCATION_NAME_CACHE[loc_id] = name
+        names.update(found)
+
+    return {loc_id: names.get(loc_id, UNKNOWN_LOCATION) for loc_id in loc_ids}
+
+async def get_location_name(loc_id):
+    return (await get_location_names([loc_id]))[loc_id]
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+
+'''
+shared read-only access to locations.db.
+
+each thread keeps one long-lived connection (opened read-only with tuned pragmas) instead of
+opening a new connection per request. sqlite3 keeps prepared statements per connection
+(cached_statements), so the hot queries below are only compiled once per thread.
+
+writes (database_sync) still use their own read-write connection. WAL mode lets these readers
+see each sync as soon as it commits.
+'''
+
+DB_FILE = 'server/data/database/locations.db'
+
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE_MB', '256')) * 2**20
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_MB', '32')) * 1024
+CACHED_STATEMENTS = 256
+
+# hotspots joined with their region names, shared by search, report and browse queries
+HOTSPOT_COLUMNS = "h.id, h.name, c.country_name, s1.subnational1_name, s2.subnational2_name, h.species_count, h.norm_name"
+HOTSPOT_JOIN = "'hotspots' AS h LEFT JOIN 'countries' AS c ON h.country_code = c.country_code LEFT JOIN 'subregions1' AS s1 ON h.subnational1_code = s1.subnational1_code LEFT JOIN 'subregions2' AS s2 ON h.subnational2_code = s2.subnational2_code"
+
+# PRAGMA user_version of a locations.db whose hotspots have the stable hotspot_key and search/geo
+# indexes keyed on it. only database_sync (a sync or --migrate) builds them, this module never writes
+SCHEMA_VERSION = 1
+
+HOTSPOT_BY_ID_SQL = f"SELECT {HOTSPOT_COLUMNS} FROM {HOTSPOT_JOIN} WHERE h.id = ?"
+OVERVIEWS_SQL = f"SELECT {HOTSPOT_COLUMNS} FROM {HOTSPOT_JOIN} ORDER BY h.species_count DESC LIMIT ? OFFSET ?"
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+# bumped by close_connections(), threads holding a connection from an older generation reopen
+_generation = 0
+
+def open_connection():
+    conn = sqlite3.connect(
+        f"file:{DB_FILE}?mode=ro",
+        uri=True,
+        cached_statements=CACHED_STATEMENTS,
+        # only used by the owning thread, but close_connections() runs on the shutdown thread
+        check_same_thread=False
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """this thread's read-only connection, opened on first use and after close_connections()"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.generation != _generation:
+        conn = open_connection()
+        with _connections_lock:
+            _local.conn = conn
+            _local.generation = _generation
+            _connections.append(conn)
+    return conn
+
+def query(sql, params=()):
+    return get_connection().execute(sql, params).fetchall()
+
+def query_one(sql, params=()):
+    return get_connection().execute(sql, params).fetchone()
+
+def has_indexed_table(name):
+    """true if the database is at SCHEMA_VERSION and has the table (e.g. an index built by database_sync)"""
+    return query_one("PRAGMA user_version")[0] >= SCHEMA_VERSION and query_one("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)) is not None
+
+def close_connections():
+    """close every pooled connection (shutdown), threads reopen on next use"""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        closed = len(_connections)
+        _connections.clear()
+    print(f"[Database] | closed {closed} pooled read-only connections")
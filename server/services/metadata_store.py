@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+'''
+on-disk store for species metadata (common name + image url), keyed by eBird species code.
+
+replaces loading the whole pretty-printed bird_metadata_cache.json at import: nothing is read
+until the first lookup, lookups are primary key reads, and new image urls are upserted one row
+at a time instead of rewriting the file.
+
+the store is seeded from METADATA_CACHE_FILE the first time it is opened, and again whenever that
+file is newer than the last seed (e.g. a refreshed json committed after a prefetch elsewhere).
+reseeding adds new species and fills in missing images, it never replaces stored ones. the json
+doesn't record when images were fetched, so seeded rows count as fetched at seeding time.
+
+prefetch_queue holds the species an image prefetch still has to visit, so an interrupted run
+picks up where it stopped (see image_prefetch).
+'''
+
+STORE_FILE = os.getenv('BIRD_METADATA_STORE_FILE', 'server/data/database/bird_metadata.db')
+METADATA_CACHE_FILE = 'server/data/bird_metadata_cache.json'
+
+# sqlite caps bound parameters per statement (999 on older builds)
+MAX_PARAMS = 900
+
+_conn = None
+_lock = threading.Lock()
+
+def _connect():
+    global _conn
+    if _conn is None:
+        sqlConn = sqlite3.connect(STORE_FILE, timeout=30, check_same_thread=False)
+        sqlConn.execute("PRAGMA journal_mode=WAL")
+        sqlConn.execute('''CREATE TABLE IF NOT EXISTS species_metadata (
+            code TEXT PRIMARY KEY,
+            com_name TEXT,
+            image_url TEXT,
+            updated_at REAL
+        ) WITHOUT ROWID''')
+        sqlConn.execute('''CREATE TABLE IF NOT EXISTS prefetch_queue (
+            code TEXT PRIMARY KEY,
+            com_name TEXT,
+            position INTEGER NOT NULL
+        ) WITHOUT ROWID''')
+        sqlConn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID")
+        sqlConn.commit()
+
+        seed_from_json(sqlConn)
+
+        _conn = sqlConn
+    return _conn
+
+def seed_from_json(sqlConn, path=METADATA_CACHE_FILE):
+    """import the json metadata cache if it changed since the last seed (new species and missing images only)"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return 0
+
+    seeded = sqlConn.execute("SELECT value FROM store_meta WHERE key = 'seeded_mtime'").fetchone()
+    if seeded and seeded[0] >= mtime:
+        return 0
+
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[store] | failed to read {path}: {e}")
+        return 0
+
+    with sqlConn:
+        sqlConn.executemany(
+            '''INSERT INTO species_metadata (code, com_name, image_url, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(code) DO UPDATE SET
+                com_name = COALESCE(com_name, excluded.com_name),
+                image_url = excluded.image_url,
+                updated_at = excluded.updated_at
+            WHERE image_url IS NULL AND excluded.image_url IS NOT NULL''',
+            ((code, info.get('comName'), info.get('imageUrl'), time.time()) for code, info in data.items())
+        )
+        sqlConn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('seeded_mtime', ?)", (mtime,))
+    print(f"[store] | {'reseeded' if seeded else 'seeded'} species metadata store from {path} ({len(data)} entries)")
+    return len(data)
+
+def get_image_url(code):
+    """stored image url for a species code, or None"""
+    try:
+        with _lock:
+            row = _connect().execute("SELECT image_url FROM species_metadata WHERE code = ?", (code,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"[store] | species metadata lookup failed for {code}: {e}")
+        return None
+
+def get_image_urls(codes):
+    """
+    stored image urls for many species codes in one query per MAX_PARAMS codes.
+
+    returns: dict of code -> image url (codes without an image are left out)
+    """
+    codes = list(dict.fromkeys(c for c in codes if c))
+    found = {}
+    try:
+        with _lock:
+            sqlConn = _connect()
+            for i in range(0, len(codes), MAX_PARAMS):
+                chunk = codes[i:i + MAX_PARAMS]
+                rows = sqlConn.execute(
+                    f"SELECT code, image_url FROM species_metadata WHERE image_url IS NOT NULL AND code IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update(rows)
+    except sqlite3.Error as e:
+        print(f"[store] | species metadata lookup failed: {e}")
+    return found
+
+def save_metadata(code, com_name=None, image_url=None):
+    """upsert one species, keeps the stored name/image when the new value is None"""
+    try:
+        with _lock:
+            sqlConn = _connect()
+            with sqlConn:
+                sqlConn.execute(
+                    '''INSERT INTO species_metadata (code, com_name, image_url, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(code) DO UPDATE SET
+                        com_name = COALESCE(excluded.com_name, com_name),
+                        image_url = COALESCE(excluded.image_url, image_url),
+                        updated_at = excluded.updated_at''',
+                    (code, com_name, image_url, time.time())
+                )
+        return True
+    except sqlite3.Error as e:
+        print(f"[store] | failed to save species metadata for {code}: {e}")
+        return False
+
+def get_fresh_codes(max_age):
+    """species codes with an image fetched less than max_age seconds ago"""
+    with _lock:
+        rows = _connect().execute(
+            "SELECT code FROM species_metadata WHERE image_url IS NOT NULL AND updated_at >= ?",
+            (time.time() - max_age,)
+        )
+        return {row[0] for row in rows}
+
+def get_prefetch_queue():
+    """species left over from an interrupted prefetch, in the order they were queued"""
+    with _lock:
+        return _connect().execute("SELECT code, com_name FROM prefetch_queue ORDER BY position").fetchall()
+
+def fill_prefetch_queue(species):
+    """replace the prefetch queue with [(code, com_name), ...]"""
+    with _lock:
+        sqlConn = _connect()
+        with sqlConn:
+            sqlConn.execute("DELETE FROM prefetch_queue")
+            sqlConn.executemany(
+                "INSERT OR IGNORE INTO prefetch_queue (code, com_name, position) VALUES (?, ?, ?)",
+                ((code, com_name, i) for i, (code, com_name) in enumerate(species))
+            )
+
+def complete_prefetch(code, com_name, image_url):
+    """
+    record a prefetch result and take the species off the queue in one transaction.
+    a failed refresh (no image_url) keeps the stored image and its age.
+    """
+    try:
+        with _lock:
+            sqlConn = _connect()
+            with sqlConn:
+                if image_url:
+                    sqlConn.execute(
+                        '''INSERT INTO species_metadata (code, com_name, image_url, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(code) DO UPDATE SET com_name = excluded.com_name, image_url = excluded.image_url, updated_at = excluded.updated_at''',
+                        (code, com_name, image_url, time.time())
+                    )
+                else:
+                    sqlConn.execute("INSERT OR IGNORE INTO species_metadata (code, com_name, image_url, updated_at) VALUES (?, ?, NULL, ?)", (code, com_name, time.time()))
+                sqlConn.execute("DELETE FROM prefetch_queue WHERE code = ?", (code,))
+        return True
+    except sqlite3.Error as e:
+        print(f"[store] | failed to save prefetch result for {code}: {e}")
+        return False
+
+def get_all_metadata():
+    """every stored species as code -> (com_name, image_url)"""
+    with _lock:
+        return {row[0]: row[1:] for row in _connect().execute("SELECT code, com_name, image_url FROM species_metadata")}
+
+def close_store():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
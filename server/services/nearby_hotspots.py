@@ -0,0 +1,108 @@
+import math
+import sqlite3
+from services.locations_db import query, query_one, has_indexed_table, HOTSPOT_COLUMNS, HOTSPOT_JOIN
+
+'''
+"best hotspots near me": hotspots within a radius of a point, from an R*Tree over hotspot coordinates.
+
+the R*Tree narrows the search to a bounding box around the point, exact great-circle distances
+are only computed for the hotspots inside it. entries are keyed on hotspots.hotspot_key, which
+survives a VACUUM (the implicit rowid of the TEXT-keyed table may not).
+
+built by database_sync only (every sync, or --migrate), the app never writes locations.db.
+coordinates come from the eBird API, so a database that hasn't been synced since they were
+added has an empty index and nearby lookups report it as unavailable instead of finding nothing.
+'''
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEO_INDEX_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS hotspots_geo USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+
+# rtree stores 32-bit floats rounded outwards, so boxes are matched by overlap and
+# distances use the exact coordinates from the hotspots table
+NEARBY_SQL = f"SELECT {HOTSPOT_COLUMNS}, h.lat, h.lng FROM hotspots_geo AS g, {HOTSPOT_JOIN} WHERE h.hotspot_key = g.id AND g.max_lat >= ? AND g.min_lat <= ? AND g.max_lng >= ? AND g.min_lng <= ?"
+
+def rebuild_geo_index(cursor):
+    # dropping is much faster than deleting every entry of a large R*Tree
+    cursor.execute("DROP TABLE IF EXISTS hotspots_geo")
+    cursor.execute(GEO_INDEX_DDL)
+    cursor.execute("INSERT INTO hotspots_geo (id, min_lat, max_lat, min_lng, max_lng) SELECT hotspot_key, lat, lat, lng, lng FROM hotspots WHERE lat IS NOT NULL AND lng IS NOT NULL")
+
+GEO_INDEX_READY = False
+
+def has_geo_index():
+    """true once a sync has filled the geo index, rechecked until then"""
+    global GEO_INDEX_READY
+    if not GEO_INDEX_READY:
+        try:
+            GEO_INDEX_READY = has_indexed_table('hotspots_geo') and query_one("SELECT 1 FROM hotspots_geo LIMIT 1") is not None
+        except sqlite3.Error:
+            GEO_INDEX_READY = False
+    return GEO_INDEX_READY
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def get_bounding_boxes(lat, lng, radius_km):
+    """
+    (min_lat, max_lat, min_lng, max_lng) boxes covering every point within radius_km.
+    two boxes when the circle crosses the antimeridian, all longitudes near the poles.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    min_lat = lat - math.degrees(angular)
+    max_lat = lat + math.degrees(angular)
+
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90), min(max_lat, 90), -180, 180)]
+
+    # widest longitude offset of the circle (not at the center latitude)
+    dlng = math.degrees(math.asin(math.sin(angular) / math.cos(math.radians(lat))))
+    min_lng, max_lng = lng - dlng, lng + dlng
+
+    if min_lng < -180:
+        return [(min_lat, max_lat, min_lng + 360, 180), (min_lat, max_lat, -180, max_lng)]
+    if max_lng > 180:
+        return [(min_lat, max_lat, min_lng, 180), (min_lat, max_lat, -180, max_lng - 360)]
+    return [(min_lat, max_lat, min_lng, max_lng)]
+
+def get_nearby_hotspots(lat: float, lng: float, radius_km: float = 25, limit: int = 20, sort: str = 'distance'):
+    """
+    hotspots within radius_km of (lat, lng).
+
+    sort='distance': nearest first, more species first at equal distance
+    sort='species': most species first, nearest first at equal counts
+
+    returns: list of overview dicts with lat, lng and distanceKm, or None if the query failed
+    """
+    try:
+        rows = []
+        for box in get_bounding_boxes(lat, lng, radius_km):
+            rows.extend(query(NEARBY_SQL, box))
+    except sqlite3.Error as e:
+        print(f" [Database Request] | Nearby hotspots retrieval failed: {e}")
+        return None
+
+    nearby = []
+    for r in rows:
+        distance = haversine_km(lat, lng, r[7], r[8])
+        if distance <= radius_km:
+            nearby.append((distance, r))
+
+    if sort == 'species':
+        nearby.sort(key=lambda x: (-(x[1][5] or 0), x[0]))
+    else:
+        nearby.sort(key=lambda x: (x[0], -(x[1][5] or 0)))
+
+    return [{
+        "id": r[0],
+        "name": r[1],
+        "country": r[2],
+        "subregion1": r[3],
+        "subregion2": r[4],
+        "speciesCount": r[5] or 0,
+        "lat": r[7],
+        "lng": r[8],
+        "distanceKm": round(distance, 2)
+    } for distance, r in nearby[:limit]]
@@ -95,6 +95,10 @@ async def generate_pdf(
                     )
                     
                     if data:
+                        # the printed report can't pick up images later, wait for the pending ones here
+                        from services.bird_metadata import fill_pending_images
+                        await fill_pending_images(data['birds'])
+
                         await route.fulfill(
                             status=200,
                             content_type="application/json",
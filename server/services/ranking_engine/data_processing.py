@@ -2,15 +2,19 @@
 main ranker script. uses data_request.py to fetch data and rank_calculator.py calculate ranks. currently creates result_dict for a single location.
 '''
 ##### imports
-from  services.ranking_engine.rank_calculator import process_data
-from  services.ranking_engine.fetch_barcharts import fetch_data, ensure_session, HEADLESS
+from  services.ranking_engine.rank_calculator import process_data, parse_barchart, combine_barcharts
+from  services.ranking_engine.fetch_barcharts import fetch_data, ensure_session, HEADLESS, FETCH_BACKEND
+from  services.ranking_engine.executor import run_stage
 import pandas as pd
-import os, httpx
+import os, httpx, asyncio
 from playwright.async_api import async_playwright
 
 ### config
 SAVE_FILE = False
 BROWSER = None
+# 'range': one eBird request for byr..eyr
+# 'yearly': one request per year, stored and summed locally so new ranges reuse stored years
+FETCH_MODE = os.getenv('BARCHART_FETCH_MODE', 'range').lower()
 
 ##### helper functions
 # load locations from a text file
@@ -45,6 +49,69 @@ def create_locations():
 
     return location_list
 
+# fill in the default year range (last 20 years up to the current year)
+def resolve_years(start_yr=None, end_yr=None):
+    from datetime import datetime
+    current_year = datetime.now().year
+    start_yr = start_yr if start_yr else current_year - 20  # default to 20 years ago
+    end_yr = end_yr if end_yr else current_year
+    return start_yr, end_yr
+
+# get one year's barchart, from the store if fresh, otherwise from eBird
+async def fetch_year_barchart(BROWSER, locId, year):
+    from services.barchart_store import load_barchart, save_barchart
+
+    barchart = await asyncio.to_thread(load_barchart, locId, year, year)
+    if barchart is not None:
+        return barchart
+
+    # the current year's slice expires daily, if eBird fails fall back to the last one stored
+    try:
+        raw_data = await fetch_data(BROWSER, locId, year, year)
+    except Exception as e:
+        stale = await asyncio.to_thread(load_barchart, locId, year, year, allow_stale=True)
+        if stale is None:
+            raise
+        print(f"[calc] | fetch failed for {locId} {year} ({e}) - using stale yearly barchart")
+        return stale
+    if not raw_data:
+        return await asyncio.to_thread(load_barchart, locId, year, year, allow_stale=True)
+
+    barchart = await run_stage('parse', parse_barchart, raw_data)
+    await asyncio.to_thread(save_barchart, locId, year, year, barchart)
+    return barchart
+
+# compose a year range from per-year slices (only missing years and the current year hit eBird)
+async def fetch_yearly_barchart(BROWSER, locId, start_yr, end_yr):
+    slices = await asyncio.gather(*(
+        fetch_year_barchart(BROWSER, locId, year) for year in range(start_yr, end_yr + 1)
+    ))
+
+    if any(s is None for s in slices):
+        return None
+
+    print(f"[calc] | composed {locId} {start_yr}-{end_yr} from {len(slices)} yearly barcharts")
+    return await run_stage('combine', combine_barcharts, slices)
+
+# fetch and parse a barchart from eBird (per FETCH_MODE)
+async def fetch_barchart(locId, start_yr, end_yr):
+    # get shared browser instance (fast - no cold start)
+    # the httpx backend only needs chromium to log in, ensure_session launches it on demand
+    BROWSER = None
+    if FETCH_BACKEND == 'playwright':
+        from services.browser_manager import get_browser
+        BROWSER = await get_browser()
+
+    # await the session check
+    await ensure_session(BROWSER)
+
+    # await the fetch data call
+    if FETCH_MODE == 'yearly':
+        return await fetch_yearly_barchart(BROWSER, locId, start_yr, end_yr)
+
+    raw_data = await fetch_data(BROWSER, locId, start_yr, end_yr)
+    return await run_stage('parse', parse_barchart, raw_data) if raw_data else None
+
 ##### main function
 async def get_rankings(
     locId: str,
@@ -54,7 +121,10 @@ async def get_rankings(
     start_week: int | None = None,
     end_month: int | None = None,
     end_week: int | None = None,
-    cached_raw_data: str | None = None  # pass raw tsv data to skip eBird fetch
+    cached_raw_data: str | None = None,  # pass raw tsv data to skip eBird fetch
+    cached_barchart=None,  # pass a ParsedBarchart to skip eBird fetch and TSV parsing
+    top_k: int | None = None,
+    enrich: bool = True
 ):
     """
     get bird rankings for a location with optional month/week filtering.
@@ -68,43 +138,43 @@ async def get_rankings(
         end_month: End month (1-12)
         end_week: End week within end_month (1-4)
         cached_raw_data: If provided, skip eBird fetch and use this raw TSV data
+        cached_barchart: If provided, skip eBird fetch and parsing and use this ParsedBarchart
+        top_k: If provided, only rank and return the top_k species
+        enrich: If False, birds are returned without codes, URLs and images
     
     returns:
-        Dictionary with location name, sample size, ranked bird data, and raw_tsv for caching
+        Dictionary with location name, sample size, ranked bird data, and the parsed barchart for caching
     """
     
     process_list = [locId.upper()]
     
     try:
-        from datetime import datetime
-        current_year = datetime.now().year
-        start_yr = start_yr if start_yr else current_year - 20  # default to 20 years ago
-        end_yr = end_yr if end_yr else current_year
+        start_yr, end_yr = resolve_years(start_yr, end_yr)
 
     except Exception as e:
             raise Exception(f"Invalid Daterange - {e}")
 
-    # if we have cached raw data, skip the expensive eBird fetch
-    if cached_raw_data:
+    # if we have cached parsed or raw data, skip the expensive eBird fetch
+    barchart = cached_barchart
+    raw_data = None
+
+    if barchart is not None:
+        print(f"[cache] | using cached parsed barchart for {locId} (skipping eBird fetch and parsing)")
+    elif cached_raw_data:
         print(f"[cache] | using cached raw TSV for {locId} (skipping eBird fetch)")
         raw_data = cached_raw_data
     else:
-        # get shared browser instance (fast - no cold start)
-        from services.browser_manager import get_browser
-        BROWSER = await get_browser()
-
-        # await the session check
-        await ensure_session(BROWSER)
-
-        # await the fetch data call
-        raw_data = await fetch_data(BROWSER, process_list[0], start_yr, end_yr)
+        barchart = await fetch_barchart(process_list[0], start_yr, end_yr)
 
     # process in memory
-    if raw_data:
+    if barchart is not None or raw_data:
         try:
+            if barchart is None:
+                barchart = await run_stage('parse', parse_barchart, raw_data)
+
             # await the calculator process
             result_dict = await process_data(
-                raw_data,
+                barchart,
                 process_list[0],
                 start_yr,
                 end_yr,
@@ -112,18 +182,18 @@ async def get_rankings(
                 start_week=start_week,
                 end_month=end_month,
                 end_week=end_week,
-                save=SAVE_FILE
+                save=SAVE_FILE,
+                top_k=top_k,
+                enrich=enrich
             )
 
             if SAVE_FILE:
                 print ({"Request Status":"[success] | saved results to output directory"})
-                result_dict['raw_tsv'] = raw_data  # include raw data for caching
-                return result_dict
-        
             else:
                 print(f"[success] | results stored in memory: result_dict (location: {result_dict['location']})")
-                result_dict['raw_tsv'] = raw_data  # include raw data for caching
-                return result_dict
+
+            result_dict['barchart'] = barchart  # include parsed data for caching
+            return result_dict
             
         except Exception as e:
             raise Exception(f"Calculation failed: {e}")
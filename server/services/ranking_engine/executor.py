@@ -0,0 +1,120 @@
+'''
+executor layer for the cpu-heavy ranking stages (tsv parsing, combining yearly slices, ranking).
+
+keeps pandas/numpy work off the event loop so one big hotspot doesn't stall every other
+request and job. configured with:
+    RANK_EXECUTOR: 'thread' (default), 'process' or 'inline' (run on the loop, for debugging)
+    RANK_EXECUTOR_WORKERS: pool size (default: cpu count, max 4)
+
+in process mode barcharts cross the process boundary as their compact arrays only
+(see ParsedBarchart.__getstate__), never as raw TSV text or prefix-sum tables. stages that
+re-filter one barchart (run_barchart_stage) keep it resident in each worker, so a re-filter
+sends only its window and the worker's prefix sums are reused instead of rebuilt per call.
+    RANK_WORKER_CACHE_SIZE: barcharts kept per worker process (default 32)
+'''
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cachetools import LRUCache
+
+RANK_EXECUTOR = os.getenv('RANK_EXECUTOR', 'thread').lower()
+RANK_EXECUTOR_WORKERS = int(os.getenv('RANK_EXECUTOR_WORKERS', min(4, os.cpu_count() or 1)))
+RANK_WORKER_CACHE_SIZE = int(os.getenv('RANK_WORKER_CACHE_SIZE', '32'))
+
+EXECUTOR = None
+
+# parent side: ids handed out to barcharts the first time they are sent to a worker
+_resident_ids = itertools.count(1)
+# worker side: resident id -> ParsedBarchart (with its prefix sums once built)
+_WORKER_BARCHARTS = LRUCache(maxsize=max(1, RANK_WORKER_CACHE_SIZE))
+
+# stage name -> run count and total/max wall time in ms
+STAGE_STATS = {}
+
+def get_executor():
+    global EXECUTOR
+    if EXECUTOR is None and RANK_EXECUTOR != 'inline':
+        if RANK_EXECUTOR == 'process':
+            EXECUTOR = ProcessPoolExecutor(max_workers=RANK_EXECUTOR_WORKERS)
+        else:
+            EXECUTOR = ThreadPoolExecutor(max_workers=RANK_EXECUTOR_WORKERS, thread_name_prefix='rank')
+        print(f"[calc] | started {RANK_EXECUTOR} executor with {RANK_EXECUTOR_WORKERS} workers")
+    return EXECUTOR
+
+def shutdown_executor():
+    global EXECUTOR
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        EXECUTOR = None
+        print("[calc] | executor shut down")
+
+def record_stage(name, elapsed_ms):
+    stats = STAGE_STATS.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    stats["count"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+def get_stage_stats():
+    return {
+        name: {
+            "count": s["count"],
+            "avg_ms": round(s["total_ms"] / s["count"], 1),
+            "max_ms": round(s["max_ms"], 1)
+        }
+        for name, s in STAGE_STATS.items()
+    }
+
+async def run_stage(name, fn, *args, **kwargs):
+    """run one cpu-bound stage on the configured executor and record its wall time"""
+    start = time.perf_counter()
+
+    executor = get_executor()
+    if executor is None:
+        result = fn(*args, **kwargs)
+    else:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(executor, _call, fn, args, kwargs)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    record_stage(name, elapsed_ms)
+    print(f"[calc] | {name} took {elapsed_ms:.1f} ms ({RANK_EXECUTOR})")
+    return result
+
+async def run_barchart_stage(name, fn, barchart, **kwargs):
+    """
+    run fn(barchart, **kwargs) like run_stage. in process mode the worker that picks the call
+    up uses its resident copy of the barchart, the barchart itself is only sent to workers
+    that don't have it yet (one extra round trip for them).
+    """
+    if RANK_EXECUTOR != 'process':
+        return await run_stage(name, fn, barchart, **kwargs)
+
+    start = time.perf_counter()
+    executor = get_executor()
+    if barchart.resident_id is None:
+        barchart.resident_id = next(_resident_ids)
+
+    loop = asyncio.get_running_loop()
+    found, result = await loop.run_in_executor(executor, _call_resident, fn, barchart.resident_id, None, kwargs)
+    if not found:
+        _, result = await loop.run_in_executor(executor, _call_resident, fn, barchart.resident_id, barchart, kwargs)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    record_stage(name, elapsed_ms)
+    print(f"[calc] | {name} took {elapsed_ms:.1f} ms ({RANK_EXECUTOR}, {'resident' if found else 'sent barchart'})")
+    return result
+
+# run_in_executor only forwards positional args, this keeps kwargs picklable for process pools
+def _call(fn, args, kwargs):
+    return fn(*args, **kwargs)
+
+# runs in a worker process: (False, None) when the barchart isn't resident and wasn't sent
+def _call_resident(fn, resident_id, barchart, kwargs):
+    resident = _WORKER_BARCHARTS.get(resident_id)
+    if resident is None:
+        if barchart is None:
+            return False, None
+        resident = _WORKER_BARCHARTS[resident_id] = barchart
+    return True, fn(resident, **kwargs)
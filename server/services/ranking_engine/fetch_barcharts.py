@@ -1,10 +1,17 @@
 ''''
 automated data request to eBird using Playwright for session/cookie management.
 handles login and cookie storage + grabbing data from eBird barchart websites for specific hotspots.
+
+fetch backends (EBIRD_FETCH_BACKEND):
+    playwright: every fetch opens a browser request context from the session file
+    httpx: cookies from the session file are loaded once into a pooled, keep-alive (HTTP/2 when h2
+           is installed) httpx client. playwright is only used to (re)login in ensure_session
 '''
 ##### imports
 import os
+import json
 import asyncio
+import httpx
 from playwright.async_api import async_playwright
 from dotenv import load_dotenv
 
@@ -16,15 +23,89 @@ SESSION_FILE = os.getenv('SESSION_FILE')
 # set to false to watch what the BROWSERs are doing
 HEADLESS = True
 
+FETCH_BACKEND = os.getenv('EBIRD_FETCH_BACKEND', 'playwright').lower()
+print(f"[config] | EBIRD_FETCH_BACKEND set to {FETCH_BACKEND}")
+
+# http2 needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_http_client: httpx.AsyncClient = None
+_http_cookies_mtime = None
+
 ##### helper functions
+# current resident set size in MB (linux), falls back to peak rss
+def get_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# convert playwright storage_state cookies into an httpx cookie jar
+def load_session_cookies():
+    jar = httpx.Cookies()
+    with open(SESSION_FILE, 'r') as f:
+        state = json.load(f)
+    for cookie in state.get('cookies', []):
+        jar.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    return jar
+
+# shared httpx client, cookies are reloaded whenever the session file changes (after a re-login)
+async def get_http_client():
+    global _http_client, _http_cookies_mtime
+
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            http2=HTTP2,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=concurrency_limit * 2, max_keepalive_connections=concurrency_limit),
+            timeout=30,
+            follow_redirects=True
+        )
+        print(f"[fetch] | httpx client ready (http2={HTTP2})")
+
+    mtime = os.path.getmtime(SESSION_FILE) if os.path.exists(SESSION_FILE) else None
+    if mtime and mtime != _http_cookies_mtime:
+        _http_client.cookies = load_session_cookies()
+        _http_cookies_mtime = mtime
+
+    return _http_client
+
+async def close_http_client():
+    global _http_client, _http_cookies_mtime
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
+        _http_cookies_mtime = None
+
 # check if we need to get cookies again
-async def is_session_valid(BROWSER):
+async def is_session_valid(BROWSER=None):
     # do the cookies exist
     if not os.path.exists(SESSION_FILE):
         return False
+
     # if they do, try to ping a force login page and see if it redirects us
+    if FETCH_BACKEND == 'httpx':
+        try:
+            client = await get_http_client()
+            response = await client.get("https://ebird.org/prefs", timeout=15)
+            return "login" not in str(response.url)
+        except Exception:
+            return False
+
     context = None
     try:
+        if BROWSER is None:
+            from services.browser_manager import get_browser
+            BROWSER = await get_browser()
+
         # await the context creation
         context = await BROWSER.new_context(storage_state=SESSION_FILE)
         request_context = context.request 
@@ -44,8 +125,8 @@ session_lock = asyncio.Lock()
 import time
 LAST_SESSION_CHECK = 0
 
-# get new cookies via playwright
-async def ensure_session(BROWSER):
+# get new cookies via playwright (browser is only launched if a login is needed)
+async def ensure_session(BROWSER=None):
     global LAST_SESSION_CHECK
     
     # fast path: in memory cache to allow parallel workers
@@ -67,6 +148,10 @@ async def ensure_session(BROWSER):
         context = None
         page = None
         try:
+            if BROWSER is None:
+                from services.browser_manager import get_browser
+                BROWSER = await get_browser()
+
             context = await BROWSER.new_context()
             page = await context.new_page()
 
@@ -114,34 +199,80 @@ concurrency_limit = int(os.getenv('EBIRD_CONCURRENCY', '2'))
 print(f"[config] | EBIRD_CONCURRENCY set to {concurrency_limit}")
 EBIRD_SEMAPHORE = asyncio.Semaphore(concurrency_limit)
 
+FETCH_STATS = {"count": 0, "total_ms": 0.0}
+
 async def fetch_data(BROWSER, loc, start, end):
+    data_url = f"https://ebird.org/barchartData?r={loc}&byr={start}&eyr={end}&bmo=1&emo=12&fmt=tsv"
+
     async with EBIRD_SEMAPHORE:
-        context = None
-        max_retries = 3
-        
-        for attempt in range(max_retries):
-            try:
-                context = await BROWSER.new_context(storage_state=SESSION_FILE)
-                data_url = f"https://ebird.org/barchartData?r={loc}&byr={start}&eyr={end}&bmo=1&emo=12&fmt=tsv"
-                
-                request_context = context.request
-                response = await request_context.get(data_url, timeout=30000)
-                data_text = await response.text()
-
-                if "<!doctype html>" in data_text.lower():
-                    raise Exception(f"eBird blocked the request (got HTML). Try again later.")
-
-                return data_text
-            except Exception as e:
-                if context:
-                    await context.close()
-                    context = None
-                
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
-                else:
-                    print(f"[error] | fetch failed for {loc}: {e}")
-                    raise
-            finally:
-                if context:
-                    await context.close()
\ No newline at end of file
+        started = time.perf_counter()
+
+        if FETCH_BACKEND == 'httpx':
+            data_text = await fetch_with_httpx(data_url, loc)
+        else:
+            data_text = await fetch_with_playwright(BROWSER, data_url, loc)
+
+        # per-fetch latency + process memory, to compare backends
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        FETCH_STATS["count"] += 1
+        FETCH_STATS["total_ms"] += elapsed_ms
+        print(f"[fetch] | {loc} {start}-{end} via {FETCH_BACKEND}: {elapsed_ms:.0f} ms, {len(data_text) / 1024:.0f} KB "
+              f"(avg {FETCH_STATS['total_ms'] / FETCH_STATS['count']:.0f} ms over {FETCH_STATS['count']}), rss {get_rss_mb():.0f} MB")
+
+        return data_text
+
+async def fetch_with_httpx(data_url, loc):
+    max_retries = 3
+
+    for attempt in range(max_retries):
+        try:
+            client = await get_http_client()
+            response = await client.get(data_url)
+            response.raise_for_status()
+            data_text = response.text
+
+            if "<!doctype html>" in data_text.lower():
+                raise Exception(f"eBird blocked the request (got HTML). Try again later.")
+
+            return data_text
+        except Exception as e:
+            if attempt < max_retries - 1:
+                await asyncio.sleep(2)
+            else:
+                print(f"[error] | fetch failed for {loc}: {e}")
+                raise
+
+async def fetch_with_playwright(BROWSER, data_url, loc):
+    if BROWSER is None:
+        from services.browser_manager import get_browser
+        BROWSER = await get_browser()
+
+    context = None
+    max_retries = 3
+    
+    for attempt in range(max_retries):
+        try:
+            context = await BROWSER.new_context(storage_state=SESSION_FILE)
+            
+            request_context = context.request
+            response = await request_context.get(data_url, timeout=30000)
+            data_text = await response.text()
+
+            if "<!doctype html>" in data_text.lower():
+                raise Exception(f"eBird blocked the request (got HTML). Try again later.")
+
+            return data_text
+        except Exception as e:
+            if context:
+                await context.close()
+                context = None
+            
+            if attempt < max_retries - 1:
+                await asyncio.sleep(2)
+            else:
+                print(f"[error] | fetch failed for {loc}: {e}")
+                raise
+        finally:
+            if context:
+                await context.close()
+                context = None
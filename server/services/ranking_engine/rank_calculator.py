@@ -3,18 +3,22 @@ calculator script. processes eBird barchart data files to compute weighted rank
 '''
 ##### imports
 import pandas as pd
+import numpy as np
 import os
 import re
-import requests
+import sys
 import unicodedata
 from dotenv import load_dotenv
 import io
+import asyncio
+from functools import lru_cache
 from services.bird_metadata import enrich_data
+from services.location_names import get_location_name
+from services.ranking_engine.executor import run_stage, run_barchart_stage
 
 ##### config
-# load api key 
+# load env (api key etc.)
 load_dotenv()
-EBIRD_API_KEY = os.getenv('EBIRD_API_KEY')
 # paths
 INPUT_DIR = 'server/data/ebird_in'
 OUTPUT_DIR = 'server/data/ebird_out'
@@ -41,19 +45,6 @@ def month_num_to_str(month_num: int) -> str:
                 return MONTH_NAMES[month_num]
         return None
 
-def get_location_name(loc_id):
-        ## call api to convert id -> name
-        url = f"https://api.ebird.org/v2/ref/hotspot/info/{loc_id}"
-        headers = {'X-eBirdAPIToken': EBIRD_API_KEY}
-
-        r = requests.get(url, headers=headers)
-
-        if r.status_code == 200:
-                data = r.json()
-                return data.get('locName', 'Unknown Location')
-
-        return 'Unknown Location'
-
 def fix_filename_string(text):
         ## normalize text to make it filename safe
         text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8')
@@ -79,51 +70,30 @@ def create_summary(filename, source_file, total_weight, df, used_weeks, location
                 for k, v in used_weeks.items():
                         f.write(f"{k}: {v}\n")
 
-##### main logic
-def calculate_metrics(df, raw_weights, month_row, start_month=None, start_week=None, end_month=None, end_week=None):
+##### week index
+@lru_cache(maxsize=32)
+def build_week_index(month_row: tuple, num_cols: int):
         """
-        filter eBird barchart data by month and week within month.
-        
+        one-time parse of the gappy month header into per-column (month, week) arrays.
+        the header is the same for every barchart, so results are memoized.
+
         args:
-                df: DataFrame with species data (columns are weekly observations)
-                raw_weights: list of sample sizes for each week
-                month_row: row containing month headers on txt file
-                start_month: month name (3letter code) or None for Jan
-                start_week: week within month 1-4 or None for week 1
-                end_month: month name (3letter code) or None for Dec
-                end_week: Wwek within month 1-4 or None for week 4
-        
+                month_row: row containing month headers on txt file (tuple so it can be cached)
+                num_cols: number of weekly data columns in the barchart
+
         returns:
-                tuple: (final_df, total_weight, used_weeks_map, cols_used_count, sample_sizes_map)
+                tuple: (months, weeks, week_keys) - int arrays (month 0 = unknown) and 'Mon_wN' labels
         """
-        
-        start_month_num = month_str_to_num(start_month) if isinstance(start_month, str) else (start_month if start_month else 1)
-        end_month_num = month_str_to_num(end_month) if isinstance(end_month, str) else (end_month if end_month else 12)
-        
-        # default config
-        if start_week is None:
-                start_week = 1
-        if end_week is None:
-                end_week = 4
-        
-        # validate inputs
-        start_week = max(1, min(4, int(start_week)))
-        end_week = max(1, min(4, int(end_week)))
-        
-        ### filter columns based on month/week range
-        cols_to_keep = []
-        weights_to_use = []
-        used_weeks_map = {} # for summary.txt
-        sample_sizes_map = {} # all weekly sample sizes for frontend
+        months = np.zeros(num_cols, dtype=np.int16)
+        weeks = np.zeros(num_cols, dtype=np.int16)
+        week_keys = []
 
         current_month = ""
         current_month_num = 0
         week_counter = 0
 
-        # iterate through cols to decide what to keep
-        for i, col_name in enumerate(df.columns[1:]): 
-                month_row_index = i + 1 
-                weight_index = i      
+        for i in range(num_cols):
+                month_row_index = i + 1
 
                 # month headers have gaps, track the last seen month
                 if month_row_index < len(month_row):
@@ -135,103 +105,414 @@ def calculate_metrics(df, raw_weights, month_row, start_month=None, start_week=N
                         else:
                                 week_counter += 1
 
-                # get this week's sample size
-                w = raw_weights[weight_index] if weight_index < len(raw_weights) else 0
-                week_key = f"{current_month}_w{week_counter}"
-                sample_sizes_map[week_key] = w 
-
-                # check if this (month, week) is in the range
-                keep = False
-                
-                if current_month_num == 0:
-                        keep = False  # unknown month, skip
-                elif start_month_num < end_month_num:
-                        # normal case:
-                        if start_month_num < current_month_num < end_month_num:
-                                keep = True  # middle months
-                        elif current_month_num == start_month_num and week_counter >= start_week:
-                                keep = True  # start month, week >= start_week
-                        elif current_month_num == end_month_num and week_counter <= end_week:
-                                keep = True  # end month, week <= end_week
-                elif start_month_num == end_month_num:
-                        # same month case
-                        if current_month_num == start_month_num and start_week <= week_counter <= end_week:
-                                keep = True
-                else:
-                        # wrap around case
-                        if current_month_num >= start_month_num or current_month_num <= end_month_num:
-                                if current_month_num == start_month_num and week_counter >= start_week:
-                                        keep = True
-                                elif current_month_num == end_month_num and week_counter <= end_week:
-                                        keep = True
-                                elif start_month_num < current_month_num or current_month_num < end_month_num:
-                                        keep = True
-
-                if keep:
-                        cols_to_keep.append(col_name)
-                        weights_to_use.append(w)
-                        used_weeks_map[week_key] = w
-
-        total_weight = sum(weights_to_use)
-
-        ### calculate wtd_rf
-        
-        # ensure numeric
-        df[cols_to_keep] = df[cols_to_keep].apply(pd.to_numeric, errors='coerce').fillna(0)
+                months[i] = current_month_num
+                weeks[i] = week_counter
+                week_keys.append(f"{current_month}_w{week_counter}")
+
+        # shared between requests, never modify in place
+        months.flags.writeable = False
+        weeks.flags.writeable = False
+
+        return months, weeks, tuple(week_keys)
+
+def parse_sample_sizes(sample_row, num_cols):
+        ## clean up the sample sizes into a weights vector aligned with the data columns
+        weights = np.zeros(num_cols, dtype=np.float64)
+        for i, x in enumerate(sample_row[1:num_cols + 1]):
+                clean_x = x.strip()
+                if clean_x.replace('.', '', 1).isdigit(): # checks for float or int
+                        weights[i] = float(clean_x)
+        return weights
+
+def resolve_window(start_month=None, start_week=None, end_month=None, end_week=None):
+        ## apply defaults (Jan w1 -> Dec w4) and clamp weeks to 1-4
+        start_month_num = month_str_to_num(start_month) if isinstance(start_month, str) else (start_month if start_month else 1)
+        end_month_num = month_str_to_num(end_month) if isinstance(end_month, str) else (end_month if end_month else 12)
 
-        # the math
-        weighted_sum = (df[cols_to_keep] * weights_to_use).sum(axis=1)
-        df['wtd_rf'] = weighted_sum / total_weight if total_weight > 0 else 0   
+        start_week = 1 if start_week is None else max(1, min(4, int(start_week)))
+        end_week = 4 if end_week is None else max(1, min(4, int(end_week)))
+
+        return start_month_num, start_week, end_month_num, end_week
+
+def get_week_mask(months, weeks, start_month=None, start_week=None, end_month=None, end_week=None):
+        """
+        turn a start_month/start_week/end_month/end_week window into a boolean column mask.
+
+        (month, week) pairs are compared as a single sortable key, so the normal, same-month
+        and wrap-around cases collapse into one range check (or its complement for wrap-around).
+        """
+        start_month_num, start_week, end_month_num, end_week = resolve_window(start_month, start_week, end_month, end_week)
+
+        keys = months * 100 + weeks
+        start_key = start_month_num * 100 + start_week
+        end_key = end_month_num * 100 + end_week
+
+        if start_month_num <= end_month_num:
+                in_range = (keys >= start_key) & (keys <= end_key)
+        else:
+                # wrap around case
+                in_range = (keys >= start_key) | (keys <= end_key)
+
+        # unknown month, skip
+        return in_range & (months > 0)
+
+def to_frequency_matrix(df):
+        ## species x weeks float matrix, only coercing columns that did not parse as numbers
+        block = df.iloc[:, 1:]
+        non_numeric = [c for c in block.columns if not pd.api.types.is_numeric_dtype(block[c])]
+        if non_numeric:
+                block = block.copy()
+                block[non_numeric] = block[non_numeric].apply(pd.to_numeric, errors='coerce')
+        return np.nan_to_num(block.to_numpy(dtype=np.float64), nan=0.0)
+
+def rank_species(species, wtd_rf, top_k=None):
+        ## sort species by wtd_rf and add rank + rfpc (percent of the top species)
+        ## with top_k, only the k best rows are selected (argpartition) and materialized
+        if top_k is not None and 0 < top_k < len(wtd_rf):
+                top = np.argpartition(-wtd_rf, top_k - 1)[:top_k]
+                order = top[np.argsort(-wtd_rf[top], kind='stable')]
+        else:
+                order = np.argsort(-wtd_rf, kind='stable')
+        sorted_rf = wtd_rf[order]
+
+        top_score = sorted_rf[0] if len(sorted_rf) else 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+                rfpc = np.nan_to_num((sorted_rf / top_score) * 100, nan=0.0) # handle div by zero
+
+        return pd.DataFrame({
+                'Rank': np.arange(1, len(order) + 1),
+                'Species': species[order],
+                'wtd_rf': sorted_rf,
+                'rfpc': rfpc
+        })
+
+##### parsed barchart
+class ParsedBarchart:
+        """
+        already-parsed form of an eBird barchart TSV, cached instead of the raw text
+        so re-filtering by time window skips text parsing entirely.
+
+        attributes:
+                species: species names (object array)
+                freq: float32 frequency matrix (species x weeks)
+                sample_sizes: sample size per week
+                month_row: month header row, used to rebuild the week index
+                raw_nbytes: size of the TSV this was parsed from (for memory accounting)
+                resident_id: set once sent to process pool workers, which keep their copy under it
+
+        prefix-sum tables over the weeks are built lazily on first use (see prefix_sums).
+        """
+        __slots__ = ('species', 'freq', 'sample_sizes', 'month_row', 'raw_nbytes', 'resident_id', '_prefix')
+
+        def __init__(self, species, freq, sample_sizes, month_row, raw_nbytes=0):
+                self.species = species
+                self.freq = freq
+                self.sample_sizes = sample_sizes
+                self.month_row = tuple(month_row)
+                self.raw_nbytes = raw_nbytes
+                self.resident_id = None
+                self._prefix = None
+
+        def __getstate__(self):
+                ## pickle only the compact arrays (process pool transfers), prefix sums are rebuilt lazily
+                return (self.species, self.freq, self.sample_sizes, self.month_row, self.raw_nbytes)
+
+        def __setstate__(self, state):
+                self.species, self.freq, self.sample_sizes, self.month_row, self.raw_nbytes = state
+                self.resident_id = None
+                self._prefix = None
+
+        @property
+        def week_index(self):
+                return build_week_index(self.month_row, self.freq.shape[1])
+
+        @property
+        def prefix_sums(self):
+                """
+                cumulative sums over the weeks, with a leading zero column.
+
+                returns:
+                        tuple: (cum_weighted, cum_samples, keys)
+                                cum_weighted: species x (weeks + 1) cumulative freq * sample_size
+                                cum_samples: (weeks + 1) cumulative sample sizes
+                                keys: sortable month * 100 + week key per column, or None when the
+                                        columns are not in calendar order (prefix windows unusable)
+                """
+                if self._prefix is None:
+                        months, weeks, _ = self.week_index
+
+                        # unknown-month columns never count towards any window
+                        weights = np.where(months > 0, self.sample_sizes, 0.0)
+
+                        num_species, num_cols = self.freq.shape
+                        cum_weighted = np.zeros((num_species, num_cols + 1), dtype=np.float64)
+                        np.cumsum(self.freq * weights, axis=1, out=cum_weighted[:, 1:])
+                        cum_samples = np.concatenate(([0.0], np.cumsum(weights)))
+
+                        keys = months * 100 + weeks
+                        if np.any(np.diff(keys) < 0):
+                                keys = None
+
+                        self._prefix = (cum_weighted, cum_samples, keys)
+                return self._prefix
+
+        @property
+        def nbytes(self):
+                ## approximate in-memory size (arrays + species name strings)
+                names = self.species.nbytes + sum(sys.getsizeof(s) for s in self.species)
+                total = names + self.freq.nbytes + self.sample_sizes.nbytes
+                if self._prefix is not None:
+                        total += self._prefix[0].nbytes + self._prefix[1].nbytes
+                return total
+
+        def memory_summary(self):
+                parsed_kb = self.nbytes / 1024
+                raw_kb = self.raw_nbytes / 1024
+                ratio = ""
+                if parsed_kb and raw_kb:
+                        ## small hotspots (or prefix sums once built) can make the parsed form the bigger one
+                        factor = raw_kb / parsed_kb
+                        ratio = f" ({factor:.1f}x smaller)" if factor >= 1 else f" ({1 / factor:.1f}x larger)"
+                return f"{parsed_kb:.0f} KB parsed vs {raw_kb:.0f} KB TSV{ratio}"
+
+def parse_barchart(raw_tsv):
+        """
+        parse a raw barchart TSV into a ParsedBarchart (species x weeks float32 matrix + sample sizes).
+
+        keeps every week column the TSV has (same axis as ranking the raw text), so
+        sample_sizes_by_week and used_weeks don't change.
+        """
+        lines = raw_tsv.splitlines()
+        month_row = lines[MONTH_ROW_INDEX].split('\t')
+        sample_row = lines[SAMPLE_SIZE_ROW_INDEX].split('\t')
+
+        ### load into pandas, skipping all headers
+        try:
+                df = pd.read_csv(
+                        io.StringIO(raw_tsv),
+                        sep='\t',
+                        header=None,
+                        skiprows=DATA_START_ROW_INDEX
+                )
+        except pd.errors.EmptyDataError:
+                # no species reported (e.g. a single year with no checklists)
+                df = pd.DataFrame({0: []})
+        df = df.rename(columns={0: 'Species'})
+        df = df.dropna(subset=['Species'])
+
+        # empty barcharts have no data columns, take the week axis from the sample size row
+        freq = to_frequency_matrix(df)
+        num_cols = freq.shape[1] if freq.shape[1] > 0 else len(sample_row) - 1
+        freq = np.pad(freq, ((0, 0), (0, num_cols - freq.shape[1])))
+        weights = parse_sample_sizes(sample_row, num_cols)
+
+        return ParsedBarchart(
+                species=df['Species'].astype(str).to_numpy(dtype=object),
+                freq=np.ascontiguousarray(freq, dtype=np.float32),
+                sample_sizes=weights,
+                month_row=month_row,
+                raw_nbytes=len(raw_tsv.encode('utf-8'))
+        )
+
+def combine_barcharts(barcharts):
+        """
+        compose one barchart from per-year slices.
+
+        detections (freq x sample size) and sample sizes are summed per week and divided back
+        out, which matches what eBird returns for the whole range (up to float rounding).
+
+        returns: ParsedBarchart, or None if there is nothing to combine
+        """
+        barcharts = [b for b in barcharts if b is not None]
+        if not barcharts:
+                return None
+
+        num_cols = max(b.freq.shape[1] for b in barcharts)
+        month_row = next(b.month_row for b in barcharts if b.freq.shape[1] == num_cols)
+
+        # union of species, in order of first appearance
+        species_index = {}
+        for b in barcharts:
+                for name in b.species:
+                        species_index.setdefault(name, len(species_index))
+
+        detections = np.zeros((len(species_index), num_cols), dtype=np.float64)
+        sample_sizes = np.zeros(num_cols, dtype=np.float64)
+
+        for b in barcharts:
+                n = b.freq.shape[1]
+                rows = np.fromiter((species_index[name] for name in b.species), dtype=np.intp, count=len(b.species))
+                np.add.at(detections, (rows, slice(0, n)), b.freq * b.sample_sizes)
+                sample_sizes[:n] += b.sample_sizes
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+                freq = np.where(sample_sizes > 0, detections / sample_sizes, 0.0)
+
+        return ParsedBarchart(
+                species=np.array(list(species_index), dtype=object),
+                freq=freq.astype(np.float32),
+                sample_sizes=sample_sizes,
+                month_row=month_row,
+                raw_nbytes=sum(b.raw_nbytes for b in barcharts)
+        )
+
+##### window math
+def window_totals(barchart, start_month=None, start_week=None, end_month=None, end_week=None):
+        """
+        weighted frequency sum per species and total sample size for a month/week window.
+
+        uses the barchart's prefix-sum tables, so a contiguous window is one subtraction and a
+        wrap-around window (e.g. Nov -> Feb) is two. falls back to a masked matrix-vector
+        product if the columns are not in calendar order.
+
+        returns:
+                tuple: (weighted_sum, total_weight)
+        """
+        cum_weighted, cum_samples, keys = barchart.prefix_sums
+
+        if keys is None:
+                months, weeks, _ = barchart.week_index
+                mask = get_week_mask(months, weeks, start_month, start_week, end_month, end_week)
+                masked_weights = np.where(mask, barchart.sample_sizes, 0.0)
+                return barchart.freq @ masked_weights, float(masked_weights.sum())
+
+        start_month_num, start_week, end_month_num, end_week = resolve_window(start_month, start_week, end_month, end_week)
+        lo = int(np.searchsorted(keys, start_month_num * 100 + start_week, side='left'))
+        hi = int(np.searchsorted(keys, end_month_num * 100 + end_week, side='right'))
+
+        if start_month_num <= end_month_num:
+                # contiguous: columns [lo, hi)
+                hi = max(hi, lo)
+                weighted_sum = cum_weighted[:, hi] - cum_weighted[:, lo]
+                total_weight = cum_samples[hi] - cum_samples[lo]
+        else:
+                # wrap around: columns [0, hi) + [lo, end)
+                weighted_sum = cum_weighted[:, hi] + (cum_weighted[:, -1] - cum_weighted[:, lo])
+                total_weight = cum_samples[hi] + (cum_samples[-1] - cum_samples[lo])
+
+        return weighted_sum, float(total_weight)
+
+def rank_window(barchart, start_month=None, start_week=None, end_month=None, end_week=None, top_k=None):
+        """
+        rank a prepared barchart for one month/week window.
+
+        returns:
+                DataFrame: ['Rank', 'Species', 'wtd_rf', 'rfpc'] sorted by wtd_rf (only the top_k rows if given)
+        """
+        weighted_sum, total_weight = window_totals(barchart, start_month, start_week, end_month, end_week)
+        wtd_rf = weighted_sum / total_weight if total_weight > 0 else np.zeros(len(barchart.species))
+        return rank_species(barchart.species, wtd_rf, top_k=top_k)
+
+def sweep_windows(barchart):
+        """
+        wtd_rf for every (start column, end column) window at once, for seasonality views.
+        start <= end is a contiguous window, start > end wraps around the end of the year.
+
+        returns:
+                tuple: (wtd_rf, total_weights)
+                        wtd_rf: float32 array (weeks x weeks x species)
+                        total_weights: float64 array (weeks x weeks)
+        """
+        cum_weighted, cum_samples, _ = barchart.prefix_sums
+        num_cols = len(cum_samples) - 1
+
+        # diff[s, e] = sum of columns s..e (negative of the complement when s > e)
+        diff_weighted = cum_weighted[:, None, 1:] - cum_weighted[:, :-1, None]
+        diff_samples = cum_samples[None, 1:] - cum_samples[:-1, None]
+
+        wraps = np.tri(num_cols, k=-1, dtype=bool)
+        sums = np.where(wraps, cum_weighted[:, -1, None, None] + diff_weighted, diff_weighted)
+        totals = np.where(wraps, cum_samples[-1] + diff_samples, diff_samples)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+                wtd_rf = np.where(totals > 0, sums / totals, 0.0)
+
+        return np.moveaxis(wtd_rf, 0, -1).astype(np.float32), totals
+
+##### main logic
+def rank_barchart(barchart, start_month=None, start_week=None, end_month=None, end_week=None, top_k=None):
+        """
+        rank a parsed barchart for a month/week window.
+
+        args:
+                barchart: ParsedBarchart
+                start_month: month name (3letter code) or None for Jan
+                start_week: week within month 1-4 or None for week 1
+                end_month: month name (3letter code) or None for Dec
+                end_week: week within month 1-4 or None for week 4
+                top_k: only rank and return the k most frequent species (None for all)
+
+        returns:
+                tuple: (final_df, total_weight, used_weeks_map, cols_used_count, sample_sizes_map)
+        """
+        ### map each column to its (month, week) for the week breakdowns
+        months, weeks, week_keys = barchart.week_index
+        mask = get_week_mask(months, weeks, start_month, start_week, end_month, end_week)
+        weights = barchart.sample_sizes.tolist()
+
+        sample_sizes_map = dict(zip(week_keys, weights)) # all weekly sample sizes for frontend
+        used_weeks_map = {k: w for k, w, keep in zip(week_keys, weights, mask) if keep} # for summary.txt
+
+        ### calculate wtd_rf, rank, rfpc
+        weighted_sum, total_weight = window_totals(barchart, start_month, start_week, end_month, end_week)
+        wtd_rf = weighted_sum / total_weight if total_weight > 0 else np.zeros(len(barchart.species))
+        final = rank_species(barchart.species, wtd_rf, top_k=top_k)
+
+        return final, total_weight, used_weeks_map, int(mask.sum()), sample_sizes_map
+
+def rank_stage(barchart, start_month=None, start_week=None, end_month=None, end_week=None, top_k=None):
+        """
+        rank_barchart plus the conversion to frontend records, run as one executor stage.
+
+        returns:
+                tuple: (final_df, records, total_weight, used_weeks_map, sample_sizes_map)
+        """
+        final, total_weight, used_weeks_map, _, sample_sizes_map = rank_barchart(
+                barchart,
+                start_month=start_month,
+                start_week=start_week,
+                end_month=end_month,
+                end_week=end_week,
+                top_k=top_k
+        )
+        return final, final.to_dict('records'), total_weight, used_weeks_map, sample_sizes_map
+
+def calculate_metrics(df, raw_weights, month_row, start_month=None, start_week=None, end_month=None, end_week=None):
+        """
+        filter eBird barchart data by month and week within month.
         
-        ### calculate rank, rfpc
+        args:
+                df: DataFrame with species data (columns are weekly observations)
+                raw_weights: list of sample sizes for each week
+                month_row: row containing month headers on txt file
+                start_month: month name (3letter code) or None for Jan
+                start_week: week within month 1-4 or None for week 1
+                end_month: month name (3letter code) or None for Dec
+                end_week: Wwek within month 1-4 or None for week 4
         
-        final = df[['Species', 'wtd_rf']].sort_values(by='wtd_rf', ascending=False).reset_index(drop=True)
-        final['Rank'] = final.index + 1
+        returns:
+                tuple: (final_df, total_weight, used_weeks_map, cols_used_count, sample_sizes_map)
+        """
+        num_cols = len(df.columns) - 1
 
-        top_score = final['wtd_rf'].iloc[0] if not final.empty else 1
-        final['rfpc'] = ( final['wtd_rf'] / top_score ) * 100
-        final['rfpc'] = final['rfpc'].fillna(0) # handle div by zero
-        
-        return final[['Rank', 'Species', 'wtd_rf', 'rfpc']], total_weight, used_weeks_map, len(cols_to_keep), sample_sizes_map
+        weights = np.zeros(num_cols, dtype=np.float64)
+        n = min(num_cols, len(raw_weights))
+        weights[:n] = raw_weights[:n]
+
+        barchart = ParsedBarchart(df['Species'].to_numpy(dtype=object), to_frequency_matrix(df), weights, month_row)
+
+        return rank_barchart(barchart, start_month, start_week, end_month, end_week)
 
 # may not be needed anymore, still good for debug
 def process_file(filepath, filename, start_month=None, start_week=None, end_month=None, end_week=None):
         print(f"[calc] | processing {filename}...")
 
-        ### read headers and sample sizes
         with open(filepath, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                month_row = lines[MONTH_ROW_INDEX].replace('\n', '').split('\t')
-                sample_row = lines[SAMPLE_SIZE_ROW_INDEX].replace('\n', '').split('\t')
-
-        # clean up the sample sizes
-        raw_weights = []
-        for x in sample_row[1:]:
-                clean_x = x.strip()
-                if clean_x.replace('.', '', 1).isdigit(): # checks for float or int
-                        raw_weights.append(float(clean_x))
-                else:
-                        raw_weights.append(0.0)
-
-        ### load into pandas
-
-        # skip all headers, add them back later
-        rows_to_skip = list(range(DATA_START_ROW_INDEX)) 
-
-        df = pd.read_csv(
-                filepath, 
-                sep='\t', 
-                header=None, 
-                skiprows=rows_to_skip
-        )
-        df = df.rename(columns={0: 'Species'})
-        df = df.dropna(subset=['Species'])        
+                barchart = parse_barchart(f.read())
 
         ### calculate metrics
-        final, total_weight, used_weeks_map, cols_used, sample_sizes_map = calculate_metrics(
-                df,
-                raw_weights,
-                month_row,
+        final, total_weight, used_weeks_map, cols_used, sample_sizes_map = rank_barchart(
+                barchart,
                 start_month=start_month,
                 start_week=start_week,
                 end_month=end_month,
@@ -242,7 +523,7 @@ def process_file(filepath, filename, start_month=None, start_week=None, end_mont
 
         # pull info for filenames
         loc_id = re.search(r'L\d+', filename).group(0)
-        loc_name = get_location_name(loc_id)
+        loc_name = asyncio.run(get_location_name(loc_id))
 
         # parse date range from filename (YYYY_YYYY_M_M)
         dates = re.search(r'(\d{4})_(\d{4})_(\d)_(\d)', filename)
@@ -264,12 +545,12 @@ def process_file(filepath, filename, start_month=None, start_week=None, end_mont
         return final, sample_sizes_map
 
 # fetch location data and process
-async def process_data(raw_tsv, loc_id, start_year, end_year, start_month=None, start_week=None, end_month=None, end_week=None, save=True):
+async def process_data(barchart, loc_id, start_year, end_year, start_month=None, start_week=None, end_month=None, end_week=None, save=True, top_k=None, enrich=True):
         """
         process eBird barchart data for API endpoint.
         
         args:
-                raw_tsv: raw barchart data as TSV string from eBird API
+                barchart: ParsedBarchart, or raw barchart data as TSV string from eBird API
                 loc_id: location ID ('L123456')
                 start_year: start year (used for fetching)
                 end_year: end year (used for fetching)
@@ -278,51 +559,31 @@ async def process_data(raw_tsv, loc_id, start_year, end_year, start_month=None,
                 end_month: month name (3-letter) or None for Dec
                 end_week: end week (1-4) or None for week 4
                 save: whether to save results to file
+                top_k: only rank, enrich and return the k most frequent species (None for all)
+                enrich: fill in bird codes, URLs and images (False leaves it to the caller, e.g. per page)
         
         returns:
-                dictionary with location, total_sample_size, sample_sizes_by_week, and ranked bird data
+                dictionary with location, total_sample_size, sample_sizes_by_week, total_species, and ranked bird data
         """
         
         print(f"[calc] | calculating rankings for {loc_id}...")
-        f_stream = io.StringIO(raw_tsv)
-        lines = f_stream.readlines()
-        
-        month_row = lines[MONTH_ROW_INDEX].replace('\n', '').split('\t')
-        sample_row = lines[SAMPLE_SIZE_ROW_INDEX].replace('\n', '').split('\t')
-
-        # clean up the sample sizes
-        raw_weights = []
-        for x in sample_row[1:]:
-                clean_x = x.strip()
-                if clean_x.replace('.', '', 1).isdigit(): 
-                        raw_weights.append(float(clean_x))
-                else:
-                        raw_weights.append(0.0)
-
-        ### load into pandas
-        f_stream.seek(0)
-        rows_to_skip = list(range(DATA_START_ROW_INDEX)) 
-
-        df = pd.read_csv(
-                f_stream, 
-                sep='\t', 
-                header=None, 
-                skiprows=rows_to_skip
-        )
-        df = df.rename(columns={0: 'Species'})
-        df = df.dropna(subset=['Species']) 
-
-        ### calculate metrics
-        final, total_weight, used_weeks_map, cols_used, sample_sizes_map = calculate_metrics(
-                df, 
-                raw_weights, 
-                month_row,
-                start_month=start_month,
-                start_week=start_week,
-                end_month=end_month,
-                end_week=end_week
+        if not isinstance(barchart, ParsedBarchart):
+                barchart = await run_stage('parse', parse_barchart, barchart)
+
+        ### calculate metrics off the event loop, looking up the location name meanwhile
+        (final, data_records, total_weight, used_weeks_map, sample_sizes_map), loc_name = await asyncio.gather(
+                run_barchart_stage(
+                        'rank',
+                        rank_stage,
+                        barchart,
+                        start_month=start_month,
+                        start_week=start_week,
+                        end_month=end_month,
+                        end_week=end_week,
+                        top_k=top_k
+                ),
+                get_location_name(loc_id)
         )
-        loc_name = get_location_name(loc_id)
 
         ### save output
         if save:
@@ -335,19 +596,17 @@ async def process_data(raw_tsv, loc_id, start_year, end_year, start_month=None,
                 out_csv = os.path.join(OUTPUT_DIR, f"rank_data_{slug}{date_str}.csv")
                 out_txt = os.path.join(OUTPUT_DIR, f"summary_{slug}{date_str}.txt")
 
-                final.to_csv(out_csv, index=False)
-                create_summary(out_txt, f"Live Data from ({loc_id})", total_weight, final, used_weeks_map, loc_name)
+                await asyncio.to_thread(final.to_csv, out_csv, index=False)
+                await asyncio.to_thread(create_summary, out_txt, f"Live Data from ({loc_id})", total_weight, final, used_weeks_map, loc_name)
                 print(f"[success] | saved: {out_csv}")
 
-        # return in a frontend stlye:
-        data_records = final.to_dict('records') # converts df to a list of dicts
-        
         # enrich species data with bird codes, URLs, and images for top 3
-        enriched_data = await enrich_data(data_records)
+        enriched_data = await enrich_data(data_records) if enrich else data_records
         
         return {
                 "location": loc_name,
                 "total_sample_size": total_weight,
                 "sample_sizes_by_week": sample_sizes_map,  # All weekly sample sizes for frontend display
+                "total_species": len(barchart.species),  # species count before any top_k cut
                 "data": enriched_data
         }
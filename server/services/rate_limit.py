@@ -0,0 +1,39 @@
+import time
+import random
+import asyncio
+
+'''
+request pacing shared by the jobs that crawl eBird in bulk (database sync, species image prefetch).
+'''
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    paces request starts to `rate` per second. capacity 1 so a burst of workers
+    can't go over the configured rate either.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def get_retry_delay(attempt, res=None):
+    # honor Retry-After on 429/503, otherwise exponential backoff with jitter
+    if res is not None:
+        retry_after = res.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(60.0, float(retry_after))
+    return min(30.0, 2 ** attempt) + random.uniform(0, 1)
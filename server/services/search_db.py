@@ -3,6 +3,10 @@ import pandas as pd
 import unicodedata
 import re
 import sqlite3, traceback
+import os, time
+from collections import deque
+from cachetools import LRUCache
+from services.locations_db import query as db_query, has_indexed_table, HOTSPOT_COLUMNS, HOTSPOT_JOIN
 
 '''
 API for dynamically searching eBird hotspot locations using rapidfuzz matching.
@@ -15,6 +19,56 @@ countryInfo = pd.read_csv('server/data/countries-Table 1.csv')
 sub1Info = pd.read_csv('server/data/subnational1 regions-Table 1.csv')
 sub2Info = pd.read_csv('server/data/subnational2 regions-Table 1.csv')
 
+#SEARCH INDEX=======================================================
+'''
+FTS5 trigram index over hotspots.norm_name (external content, so names aren't stored twice).
+Substring matches of 3+ characters are answered from the index and ordered by bm25,
+shorter queries fall back to the LIKE scan.
+
+Keyed on hotspots.hotspot_key (INTEGER PRIMARY KEY), which unlike the implicit rowid of a table
+with a TEXT primary key survives a VACUUM. Built by database_sync on every sync or with --migrate,
+until then (or if the database predates it) searches use the LIKE scan.
+'''
+SEARCH_INDEX_DDL = "CREATE VIRTUAL TABLE hotspots_fts USING fts5(norm_name, content='hotspots', content_rowid='hotspot_key', tokenize='trigram')"
+REBUILD_SEARCH_INDEX_SQL = "INSERT INTO hotspots_fts(hotspots_fts) VALUES('rebuild')"
+TRIGRAM_MIN_LENGTH = 3
+
+# rows fetched from the database for rapidfuzz to rerank
+SEARCH_CANDIDATES = 150
+
+#SEARCH CACHE=======================================================
+# hotspot candidate sets by (mode, normalized query, filters), SEARCH_CACHE_SIZE=0 disables it
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '2000'))
+SEARCH_CACHE = LRUCache(maxsize=SEARCH_CACHE_SIZE) if SEARCH_CACHE_SIZE > 0 else None
+
+# lookups by outcome and recent latencies (ms) for /hotspots/search/stats
+SEARCH_STATS = {'hit': 0, 'narrowed': 0, 'miss': 0}
+SEARCH_LATENCIES = {outcome: deque(maxlen=2000) for outcome in ('all', 'hit', 'narrowed', 'miss')}
+
+SEARCH_INDEX_READY = None
+
+def has_search_index():
+    # rechecked until found, so a sync or migration from another process is picked up
+    global SEARCH_INDEX_READY
+    if not SEARCH_INDEX_READY:
+        try:
+            SEARCH_INDEX_READY = has_indexed_table('hotspots_fts')
+        except sqlite3.Error:
+            SEARCH_INDEX_READY = False
+    return SEARCH_INDEX_READY
+
+'''
+Build FTS5 MATCH expressions from a normalized query, using tokens of 3+ characters (trigram minimum).
+
+Returns: list of expressions to try in order, names containing every token first, then any token.
+Empty if no token is long enough for the index.
+'''
+def get_match_exprs(query:str):
+    tokens = [f'"{t}"' for t in dict.fromkeys(query.split()) if len(t) >= TRIGRAM_MIN_LENGTH]
+    if len(tokens) > 1:
+        return [' AND '.join(tokens), ' OR '.join(tokens)]
+    return tokens
+
 '''
 Normalize text by removing accents, converting to basic ASCII characters, lowercasing, and triming whitespace
 
@@ -28,6 +82,58 @@ def normalize(text:str):
      no_punct = re.sub(r'[^\w\s]',' ',no_accents)
      return no_punct
 
+#REGION INDEX=======================================================
+'''
+Countries and subregions are small and only change with the CSVs, so region autocomplete runs
+against this in-memory index instead of SQLite.
+
+Names are grouped by (mode, country name, subregion1 name) for every combination of parent
+filters a search can use ('' = not filtered), with normalized names precomputed for rapidfuzz.
+'''
+def build_region_index():
+    index = {}
+
+    def add(keys, name):
+        norm = normalize(name)
+        for key in keys:
+            names, norms = index.setdefault(key, ([], []))
+            names.append(name)
+            norms.append(norm)
+
+    for name in countryInfo['country_name'].dropna():
+        add([('country', '', '')], name)
+
+    for country, name in sub1Info[['country_name', 'subnational1_name']].dropna(subset=['subnational1_name']).fillna('').itertuples(index=False):
+        add([('subregion1', '', ''), ('subregion1', country, '')], name)
+
+    for country, sub1, name in sub2Info[['country_name', 'subnational1_name', 'subnational2_name']].dropna(subset=['subnational2_name']).fillna('').itertuples(index=False):
+        add([('subregion2', '', ''), ('subregion2', country, ''), ('subregion2', '', sub1), ('subregion2', country, sub1)], name)
+
+    return index
+
+REGION_INDEX = build_region_index()
+
+'''
+Autocomplete for countries and subregions from REGION_INDEX. Same candidates as the database
+search (names starting with or containing any query token), reranked with rapidfuzz.
+
+Returns: list of {'name': ...}
+'''
+def search_regions(mode,query,country='',sub1='',limit=60):
+    names, norms = REGION_INDEX.get((mode, country, sub1), ([], []))
+
+    if not query:
+        return [{'name': name} for name in names[:limit]]
+
+    tokens = query.split()
+    candidates = [i for i, norm in enumerate(norms) if any(t in norm for t in tokens)]
+    # prefix matches first, then by name, so rapidfuzz ties keep the old ordering
+    candidates.sort(key=lambda i: (not norms[i].startswith(query), names[i]))
+
+    ranked = process.extract(query,{i: norms[i] for i in candidates},scorer=fuzz.token_set_ratio,limit=limit)
+
+    return [{'name': names[idx]} for _,_,idx in ranked]
+
             
 def dynamic_search(hotspot='',country='',subregion1='',subregion2='',mode='hotspot', limit=60):
 
@@ -45,56 +151,47 @@ def dynamic_search(hotspot='',country='',subregion1='',subregion2='',mode='hotsp
         return search_hotspots(normalize(hotspot),country,subregion1,subregion2,limit)
    
    
-def search(table,field,query,where_clause="",where_params=(),limit=60, hotspot:bool = False):
-    try:
-        with sqlite3.connect('server/data/database/locations.db') as sqlConn:
-             cursor = sqlConn.cursor()
+def fetch_candidates(table,field,where_clause="",where_params=()):
+    #get options from db (pooled read-only connection, statement cached per sql text)
+    sql_q = f"SELECT {field} FROM {table}{where_clause} LIMIT {SEARCH_CANDIDATES}"
 
-        #get options from db
-        sql_q = f"SELECT {field} FROM {table}{where_clause} LIMIT 150"
-        
-        rows = cursor.execute(sql_q, where_params).fetchall()
-
-        print("[Database Request] | ", sql_q, where_params)
-
-        names = [r[-1] for r in rows]
-        names_dict = {idx: val for idx, val in enumerate(names)}            
-
-        #fuzzy matching
-        ranked = process.extract(query,names_dict,scorer=fuzz.token_set_ratio,limit=limit)
-
-        #structure results
-        results = []
-        if hotspot:
-            for _,_,idx in ranked:
-                r = rows[idx]
-                results.append({
-                    'id': r[0],
-                    'name': r[1],
-                    'country': r[2],
-                    'subregion1': r[3],
-                    'subregion2': r[4],
-                    'speciesCount': r[5]
-                })
-            return results
+    rows = db_query(sql_q, where_params)
 
-        
+    print("[Database Request] | ", sql_q, where_params)
+
+    return rows
+
+'''
+Rerank candidate rows (norm_name last) with rapidfuzz and shape them for the API.
+'''
+def rank_candidates(query, rows, limit, hotspot:bool = False):
+    names = [r[-1] for r in rows]
+    names_dict = {idx: val for idx, val in enumerate(names)}            
+
+    #fuzzy matching
+    ranked = process.extract(query,names_dict,scorer=fuzz.token_set_ratio,limit=limit)
+
+    #structure results
+    results = []
+    if hotspot:
         for _,_,idx in ranked:
             r = rows[idx]
             results.append({
-                'name': r[1]
+                'id': r[0],
+                'name': r[1],
+                'country': r[2],
+                'subregion1': r[3],
+                'subregion2': r[4],
+                'speciesCount': r[5]
             })
         return results
-    
-    except sqlite3.Error as e:
-        print(f"[Database Request] | Database retrieval failed: {e}")
-
-        return(None)
 
-    finally:
-        if sqlConn:
-            sqlConn.close()
-            print(" [Database Request] | SQLite connection closed")
+    for _,_,idx in ranked:
+        r = rows[idx]
+        results.append({
+            'name': r[1]
+        })
+    return results
 
 def tokenize(query:str):
     w_params = ()
@@ -152,63 +249,186 @@ def get_where_clause(w_params:tuple,num_tokens:int,prefix_q:str,name:str, query:
     
 
 def search_countries(query,limit):
-    
-    w_params,num_tokens,prefix_q = tokenize(query)
+    return search_regions('country',query,limit=limit)
 
-    where,w_params = get_where_clause(w_params=w_params,num_tokens=num_tokens,query=query,prefix_q=prefix_q,name='country_name')
+def search_sub1(query, country,limit):
+    return search_regions('subregion1',query,country=country,limit=limit)
     
-    return search(
-        table='countries',
-        field='country_code, country_name, norm_name',
-        where_clause=where,
-        where_params=w_params,
-        query=query,
-        limit=limit
-    )
+def search_sub2(query,country,sub1,limit):
+    return search_regions('subregion2',query,country=country,sub1=sub1,limit=limit)
 
-def search_sub1(query, country,limit):
+'''
+Hotspot search. Candidate sets are cached by (mode, normalized query, filters), so typing
+"cent" -> "centr" -> "central park" only queries SQLite when narrowing isn't possible.
 
-    w_params,num_tokens,prefix_q = tokenize(query)
+Returns: ranked list of hotspot dicts, or None if the database query failed
+'''
+def search_hotspots(query,country,sub1,sub2,limit):
+    start = time.perf_counter()
+    key = ('hotspot', query, country, sub1, sub2)
 
-    where,w_params = get_where_clause(w_params=w_params,num_tokens=num_tokens,query=query,prefix_q=prefix_q,name='subnational1_name', country=country)
+    try:
+        entry = SEARCH_CACHE.get(key) if SEARCH_CACHE is not None else None
+        outcome = 'hit'
+        if entry is None:
+            entry = narrow_cached_candidates(query, country, sub1, sub2)
+            outcome = 'narrowed'
+        if entry is None:
+            entry = fetch_hotspot_candidates(query, country, sub1, sub2)
+            outcome = 'miss'
+        if SEARCH_CACHE is not None:
+            SEARCH_CACHE[key] = entry
 
+    except sqlite3.Error as e:
+        print(f"[Database Request] | Database retrieval failed: {e}")
+        return(None)
 
-    return search(
-        table='subregions1',
-        field='subnational1_code, subnational1_name, norm_name',
-        query=query,
-        where_clause=where,
-        where_params=w_params,
-        limit=limit
-    )
-    
-def search_sub2(query,country,sub1,limit):
+    results = rank_candidates(query, entry['rows'], limit, hotspot=True)
+    record_search(outcome, (time.perf_counter() - start) * 1000)
+    return results
+
+'''
+Tokens a query's candidates are matched on: 3+ character tokens when the trigram index answers it,
+every token for the LIKE scan.
+'''
+def get_candidate_tokens(query:str):
+    tokens = query.split()
+    if has_search_index():
+        return [t for t in tokens if len(t) >= TRIGRAM_MIN_LENGTH] or tokens
+    return tokens
 
-    w_params,num_tokens,prefix_q = tokenize(query)
+'''
+Query the database for a hotspot query's candidates.
 
-    where,w_params = get_where_clause(w_params=w_params,num_tokens=num_tokens,query=query, prefix_q=prefix_q,name='subnational2_name', country=country, sub1=sub1)
+Returns: cache entry {'rows', 'tokens', 'complete'}. complete means the rows were not cut at
+SEARCH_CANDIDATES, so they hold every hotspot containing one of the tokens.
+'''
+def fetch_hotspot_candidates(query,country,sub1,sub2):
+    match_exprs = get_match_exprs(query) if has_search_index() else []
+    if match_exprs:
+        rows = search_hotspots_indexed(query,match_exprs,country,sub1,sub2)
+    else:
+        w_params,num_tokens,prefix_q = tokenize(query)
+
+        where,w_params = get_where_clause(w_params=w_params,num_tokens=num_tokens,query=query, prefix_q=prefix_q,name='name',country=country, sub1=sub1, sub2=sub2, hotspot=True)
+
+        rows = fetch_candidates(
+            table=f" {HOTSPOT_JOIN} ",
+            field=HOTSPOT_COLUMNS,
+            where_clause=where,
+            where_params=w_params
+        )
+
+    return {
+        'rows': rows,
+        'tokens': get_candidate_tokens(query),
+        'complete': bool(query) and len(rows) < SEARCH_CANDIDATES
+    }
 
-    return search(
-        table='subregions2',
-        field='subnational2_code, subnational2_name, norm_name',
-        query=query,
-        where_clause=where,
-        where_params=w_params,
-        limit=limit
-    )
+'''
+Answer a query from the cached candidates of a shorter query it extends (same filters).
 
-def search_hotspots(query,country,sub1,sub2,limit):
+Only used when that cached set was complete and each of the new query's tokens contains one of
+its tokens (e.g. "cent" -> "central"), so filtering it gives the same candidates SQLite would return
+(rows with equal fuzzy scores may come back in a different order).
+
+Returns: cache entry, or None if no cached prefix can be narrowed
+'''
+def narrow_cached_candidates(query,country,sub1,sub2):
+    if SEARCH_CACHE is None:
+        return None
+
+    tokens = get_candidate_tokens(query)
+    if not tokens:
+        return None
+
+    for end in range(len(query) - 1, 0, -1):
+        cached = SEARCH_CACHE.get(('hotspot', query[:end], country, sub1, sub2))
+        if cached is None or not cached['complete']:
+            continue
+        if not all(any(c in t for c in cached['tokens']) for t in tokens):
+            continue
+
+        rows = [r for r in cached['rows'] if any(t in r[-1] for t in tokens)]
+        # names starting with the new query move to the front, otherwise keep the cached order
+        rows.sort(key=lambda r: not r[-1].startswith(query))
+        return {'rows': rows, 'tokens': tokens, 'complete': True}
+
+    return None
 
-    w_params,num_tokens,prefix_q = tokenize(query)
+def record_search(outcome, elapsed_ms):
+    SEARCH_STATS[outcome] += 1
+    SEARCH_LATENCIES['all'].append(elapsed_ms)
+    SEARCH_LATENCIES[outcome].append(elapsed_ms)
 
-    where,w_params = get_where_clause(w_params=w_params,num_tokens=num_tokens,query=query, prefix_q=prefix_q,name='name',country=country, sub1=sub1, sub2=sub2, hotspot=True)
+def clear_search_cache():
+    if SEARCH_CACHE is not None:
+        SEARCH_CACHE.clear()
 
-    return search(
-        table=""" 'hotspots' AS h LEFT JOIN 'countries' AS c ON h.country_code = c.country_code LEFT JOIN 'subregions1' AS s1 ON h.subnational1_code = s1.subnational1_code LEFT JOIN 'subregions2' AS s2 ON h.subnational2_code = s2.subnational2_code """,
-        field='h.id, h.name, c.country_name, s1.subnational1_name, s2.subnational2_name, h.species_count, h.norm_name',
-        query=query,
-        where_clause=where,
-        where_params=w_params,
-        limit=limit,
-        hotspot=True
-    )
\ No newline at end of file
+'''
+Cache size, hit ratio (exact + narrowed) and latency percentiles of recent hotspot searches.
+'''
+def get_search_stats():
+    lookups = sum(SEARCH_STATS.values())
+    latency = {}
+    for outcome, samples in SEARCH_LATENCIES.items():
+        if samples:
+            ordered = sorted(samples)
+            latency[outcome] = {
+                'count': len(ordered),
+                'p50_ms': round(ordered[len(ordered) // 2], 2),
+                'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2)
+            }
+
+    return {
+        'cache': {
+            'size': len(SEARCH_CACHE) if SEARCH_CACHE is not None else 0,
+            'maxsize': SEARCH_CACHE_SIZE,
+            **SEARCH_STATS,
+            'hit_ratio': round((SEARCH_STATS['hit'] + SEARCH_STATS['narrowed']) / lookups, 3) if lookups else None
+        },
+        'latency': latency
+    }
+
+'''
+Candidate retrieval from the trigram index. bm25 ranking runs inside the FTS table and only the
+best SEARCH_CANDIDATES rows are joined with their regions, then names starting with the query are
+moved to the front. Names containing every token are fetched first, the OR match only tops up
+the candidates when there are too few of those.
+'''
+def search_hotspots_indexed(query,match_exprs,country,sub1,sub2):
+
+    filters = ''
+    f_params = ()
+    if country:
+        filters += ' AND c.country_name = ?'
+        f_params += (country,)
+    if sub1:
+        filters += ' AND s1.subnational1_name = ?'
+        f_params += (sub1,)
+    if sub2:
+        filters += ' AND s2.subnational2_name = ?'
+        f_params += (sub2,)
+
+    # region filters need the joins before the cut, otherwise rank straight from the index
+    if filters:
+        candidates = f"SELECT h.hotspot_key AS rid, hotspots_fts.rank AS score FROM {HOTSPOT_JOIN}, hotspots_fts WHERE hotspots_fts.rowid = h.hotspot_key AND hotspots_fts MATCH ?{filters} ORDER BY hotspots_fts.rank LIMIT {SEARCH_CANDIDATES}"
+    else:
+        candidates = f"SELECT rowid AS rid, rank AS score FROM hotspots_fts WHERE hotspots_fts MATCH ? ORDER BY rank LIMIT {SEARCH_CANDIDATES}"
+
+    sql_q = f"SELECT {HOTSPOT_COLUMNS} FROM ({candidates}) AS f, {HOTSPOT_JOIN} WHERE h.hotspot_key = f.rid ORDER BY CASE WHEN h.norm_name LIKE ? THEN 0 ELSE 1 END, f.score"
+
+    rows = []
+    seen = set()
+    for match_expr in match_exprs:
+        w_params = (match_expr,) + f_params + (query + '%',)
+        print("[Database Request] | hotspot index search", w_params)
+
+        for r in db_query(sql_q, w_params):
+            if r[0] not in seen:
+                seen.add(r[0])
+                rows.append(r)
+        if len(rows) >= SEARCH_CANDIDATES:
+            break
+
+    return rows[:SEARCH_CANDIDATES]